@@ -1,16 +1,24 @@
 """The One Smart Control integration"""
 from __future__ import annotations
 
+import voluptuous as vol
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform, CONF_USERNAME, CONF_PASSWORD, CONF_HOST, CONF_PORT
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall
 from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady
+from homeassistant.helpers import config_validation as cv, device_registry as dr, entity_registry as er
+from homeassistant.helpers.service import async_extract_referenced_entity_ids
 
 from .const import *
 from .onesmartwrapper import OneSmartWrapper
 
 PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.SWITCH, Platform.LIGHT, Platform.CLIMATE, Platform.WATER_HEATER, Platform.SELECT, Platform.ALARM_CONTROL_PANEL]
 
+SET_ATTRIBUTES_SCHEMA = cv.make_entity_service_schema({
+    vol.Required(OneSmartFieldName.ATTRIBUTES.value): dict
+})
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up One Smart Control from a config entry."""
@@ -23,24 +31,82 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         password = entry.data.get(CONF_PASSWORD),
         host = entry.data.get(CONF_HOST),
         port = entry.data.get(CONF_PORT),
-        hass = hass
+        hass = hass,
+        entry_id = entry.entry_id,
+        poll_sockets = entry.options.get(CONF_POLL_SOCKETS, SOCKET_POLL_POOL_SIZE)
     )
     hass.data[DOMAIN][entry.entry_id][ONESMART_WRAPPER] = wrapper
 
     try:
         wrapper_status = await wrapper.setup()
     except:
+        wrapper_status = None
+    if wrapper_status != OneSmartSetupStatus.SUCCESS:
+        # Stop the sockets and runners a partial setup left behind before Home Assistant retries
+        await wrapper.close()
+        hass.data[DOMAIN].pop(entry.entry_id)
+        if wrapper_status == OneSmartSetupStatus.FAIL_AUTH:
+            raise ConfigEntryAuthFailed
         raise ConfigEntryNotReady
-    if wrapper_status == OneSmartSetupStatus.FAIL_AUTH:
-        raise ConfigEntryAuthFailed
-    elif wrapper_status != OneSmartSetupStatus.SUCCESS:
-        raise ConfigEntryNotReady  
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    if not hass.services.has_service(DOMAIN, SERVICE_SET_ATTRIBUTES):
+        async def async_set_attributes(call: ServiceCall):
+            await async_handle_set_attributes(hass, call)
+
+        hass.services.async_register(DOMAIN, SERVICE_SET_ATTRIBUTES, async_set_attributes, schema=SET_ATTRIBUTES_SCHEMA)
+
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
+
     return True
 
 
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def async_handle_set_attributes(hass: HomeAssistant, call: ServiceCall):
+    """Set apparatus attributes on every targeted device, batched per gateway"""
+    entity_registry = er.async_get(hass)
+    device_registry = dr.async_get(hass)
+    attributes = call.data[OneSmartFieldName.ATTRIBUTES.value]
+
+    # Resolve areas, devices and entities to devices of this integration
+    selected = async_extract_referenced_entity_ids(hass, call)
+    device_entry_ids = set(selected.referenced_devices)
+    for entity_id in selected.referenced | selected.indirectly_referenced:
+        entity_entry = entity_registry.async_get(entity_id)
+        if entity_entry != None and entity_entry.platform == DOMAIN and entity_entry.device_id != None:
+            device_entry_ids.add(entity_entry.device_id)
+
+    device_sets = dict()
+    for device_entry_id in device_entry_ids:
+        device_entry = device_registry.async_get(device_entry_id)
+        if device_entry == None:
+            continue
+
+        for entry_id in device_entry.config_entries:
+            if not entry_id in hass.data.get(DOMAIN, {}):
+                continue
+            wrapper: OneSmartWrapper = hass.data[DOMAIN][entry_id][ONESMART_WRAPPER]
+
+            for identifier_domain, identifier in device_entry.identifiers:
+                device_id = wrapper.get_device_id(identifier) if identifier_domain == DOMAIN else None
+                if device_id == None:
+                    continue
+
+                # Areas hold all kinds of devices, only set the attributes a device defines
+                attribute_names = wrapper.device_attribute_names.get(device_id, frozenset())
+                device_attributes = {name: value for name, value in attributes.items() if name in attribute_names}
+                if len(device_attributes) > 0:
+                    device_sets.setdefault(entry_id, dict())[device_id] = device_attributes
+
+    for entry_id, device_attributes in device_sets.items():
+        await hass.data[DOMAIN][entry_id][ONESMART_WRAPPER].set_apparatus_many(device_attributes)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
@@ -48,6 +114,9 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             await hass.data[DOMAIN][entry.entry_id][ONESMART_WRAPPER].close()
             
             hass.data[DOMAIN].pop(entry.entry_id)
+
+        if len(hass.data[DOMAIN]) == 0:
+            hass.services.async_remove(DOMAIN, SERVICE_SET_ATTRIBUTES)
         
         
 
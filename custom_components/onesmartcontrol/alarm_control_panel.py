@@ -94,16 +94,16 @@ class OneSmartAlarmPanel(OneSmartEntity, AlarmControlPanelEntity):
     @property
     def available(self) -> bool:
         value = self.get_cache_value(self._key)
-        return value is not None
+        return super().available and value is not None
 
     async def async_alarm_disarm(self, code=None):
         command_arm_home = json.loads(json.dumps(self._command_home))
-        await self.wrapper.command(SOCKET_PUSH, **command_arm_home)
+        await self.wrapper.command(SOCKET_PUSH, priority=OneSmartCommandPriority.INTERACTIVE, forget=True, **command_arm_home)
 
     async def async_alarm_arm_away(self, code=None):
         command_arm_away = json.loads(json.dumps(self._command_away))
-        await self.wrapper.command(SOCKET_PUSH, **command_arm_away)
+        await self.wrapper.command(SOCKET_PUSH, priority=OneSmartCommandPriority.INTERACTIVE, forget=True, **command_arm_away)
 
     async def async_alarm_arm_night(self, code=None):
         command_arm_night = json.loads(json.dumps(self._command_night))
-        await self.wrapper.command(SOCKET_PUSH, **command_arm_night)
+        await self.wrapper.command(SOCKET_PUSH, priority=OneSmartCommandPriority.INTERACTIVE, forget=True, **command_arm_night)
@@ -7,7 +7,7 @@ from typing import Any
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.const import (
@@ -18,7 +18,10 @@ from homeassistant.const import (
     
 )
 
-from .const import DOMAIN, INTEGRATION_TITLE, OneSmartSetupStatus, DEFAULT_PORT
+from .const import (
+    DOMAIN, INTEGRATION_TITLE, OneSmartSetupStatus, DEFAULT_PORT,
+    CONF_POLL_SOCKETS, SOCKET_POLL_POOL_SIZE, SOCKET_POLL_POOL_MAX
+)
 from .onesmartwrapper import OneSmartWrapper
 
 _LOGGER = logging.getLogger(__name__)
@@ -44,10 +47,11 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
         hass = hass
     )
 
-    # try:
-    connection_status = await wrapper.setup()
-    # except:
-    #     raise CannotConnect
+    # The wrapper is only needed to validate the connection
+    try:
+        connection_status = await wrapper.setup()
+    finally:
+        await wrapper.close()
     if connection_status == OneSmartSetupStatus.FAIL_AUTH:
         raise InvalidAuth
     elif connection_status == OneSmartSetupStatus.FAIL_NETWORK:
@@ -115,6 +119,37 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             return self.async_abort(reason="reauth_successful")
         return super().async_create_entry(title=title, data=data)
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> config_entries.OptionsFlow:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler()
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle the options of One Smart Control."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the number of poll connections."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(
+                        CONF_POLL_SOCKETS,
+                        default=self.config_entry.options.get(CONF_POLL_SOCKETS, SOCKET_POLL_POOL_SIZE),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=SOCKET_POLL_POOL_MAX)),
+                }
+            ),
+        )
+
 class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect."""
 
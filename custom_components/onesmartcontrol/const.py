@@ -8,12 +8,22 @@ DOMAIN = "onesmartcontrol"
 ONESMART_RUNNER = "runner"
 ONESMART_WRAPPER = "onesmartwrapper"
 
+SERVICE_SET_ATTRIBUTES = "set_attributes"
+
 class OneSmartUpdateTopic(str, Enum):
     PUSH = f"{DOMAIN}_push"
     POLL = f"{DOMAIN}_poll"
     DEFINITIONS = f"{DOMAIN}_definitions"
     APPARATUS = f"{DOMAIN}_apparatus"
     PRESET = f"{DOMAIN}_preset"
+    DISCOVERY = f"{DOMAIN}_discovery"
+    REMOVE = f"{DOMAIN}_remove"
+    REPLACE = f"{DOMAIN}_replace"
+    CONNECTION = f"{DOMAIN}_connection"
+
+    def target(self, target_id) -> str:
+        """Signal for the entities of a single device, meter or platform on this topic"""
+        return f"{self.value}_{target_id}"
 
 ONESMART_CACHE = "cache"
 ONESMART_KEY = "key"
@@ -21,6 +31,8 @@ ONESMART_KEY_ACTION = "key_action"
 ONESMART_KEY_TEMPERATURE = "key_temperature"
 ONESMART_KEY_TARGET_TEMPERATURE = "key_target_temperature"
 ONESMART_KEY_MODE = "key_mode"
+ONESMART_SUFFIX = "suffix"
+ONESMART_UPDATE_TARGET = "update_target"
 
 class OneSmartAccessLevel(str, Enum):
     READ = "READ"
@@ -75,8 +87,14 @@ class OneSmartEventType(str, Enum):
     DEVICE_INPUT = "device_input"
     DEVICE_STATUS = "device_status"
 
+    DISCOVERY_DEVICE_REGISTERED = "discovery_device_registered"
+
     ENERGY_CONSUMPTION = "energy_consumption"
 
+    METER_CREATE = "meter_create"
+    METER_UPDATE = "meter_update"
+    METER_DELETE = "meter_delete"
+
     PRESET_PERFORM = "preset_perform"
     PRESET_STOP = "preset_stop"
     PRESET_DELETE = "preset_delete"
@@ -97,11 +115,35 @@ class OneSmartPresetType(str, Enum):
     AREAON = "AREA{}ON"
     AREAOFF = "AREA{}OFF"
 
+class OneSmartCircuitState(str, Enum):
+    # Connected
+    CLOSED = "closed"
+    # Reconnecting after the connection dropped
+    HALF_OPEN = "half_open"
+    # Reconnecting failed repeatedly, the entities are unavailable
+    OPEN = "open"
+
+class OneSmartCommandPriority(IntEnum):
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+class OneSmartErrorCode(IntEnum):
+    PARSE_ERROR = 1
+    TIMEOUT = 3
+    NOT_AUTHENTICATED = 10
+    WRONG_PASSWORD = 12
+    NO_SUCH_COMMAND = 100
+    OBJECT_NOT_FOUND = 200
+    ARGUMENT_ERROR = 202
+    REMOTE_SYSTEM_ERROR = 300
+
 class OneSmartFieldName(str, Enum):
     ACCESS = "access"
     ACTION = "action"
     ACTIVE = "active"
     ATTRIBUTES = "attributes"
+    CODE = "code"
     COMMAND = "cmd"
     DATA = "data"
     DEVICES = "devices"
@@ -128,6 +170,7 @@ class OneSmartFieldName(str, Enum):
     ID = "id"
 
 class OneSmartTopic(str, Enum):
+    APPARATUS = "APPARATUS"
     AUTHENTICATION = "AUTHENTICATION"
     ENERGY = "ENERGY"
     DEVICE = "DEVICE"
@@ -171,27 +214,135 @@ class OneSmartDefaultSitePreset(str, Enum):
     ASLEEP = "ASLEEP"
 
 # Config
-SOCKET_BUFFER_SIZE = 1024
-SOCKET_RECEIVE_TIMEOUT = 1
+SOCKET_READ_LIMIT = 1048576
+SOCKET_MESSAGE_SEPARATOR = b"\r\n"
 SOCKET_AUTHENTICATION_TIMEOUT = 5
 SOCKET_CONNECTION_TIMEOUT = 10
-SOCKET_COMMAND_TIMEOUT = 60
-SOCKET_COMMAND_DELAY = 5
-SOCKET_RECONNECT_DELAY = 60
-SOCKET_RECONNECT_RETRIES = 5
+SOCKET_COMMAND_TIMEOUT = 30
+# Seconds a reply to an abandoned transaction is still recognized as late
+SOCKET_LATE_REPLY_WINDOW = 300
+# Maximum number of abandoned and fire-and-forget transaction ids remembered per socket
+SOCKET_UNCLAIMED_MAX = 256
+# Maximum number of pushed events waiting to be handled
+SOCKET_EVENT_QUEUE_SIZE = 1024
+SOCKET_RECONNECT_DELAY_BASE = 2
+SOCKET_RECONNECT_DELAY_MAX = 300
+SOCKET_RECONNECT_JITTER = 0.5
+# Failed reconnect attempts in a row before the entities become unavailable
+SOCKET_CIRCUIT_FAILURES = 3
+SOCKET_PIPELINE_WINDOW = 8
+SOCKET_POLL_POOL_SIZE = 2
+SOCKET_POLL_POOL_MAX = 8
+# Consecutive failed transactions before a pool connection is reconnected
+SOCKET_POOL_MAX_FAILURES = 3
+DISCOVERY_CONCURRENCY = 8
+DISCOVERY_DEVICE_TIMEOUT = 10
 SOCKET_POLL = "poll"
 SOCKET_PUSH = "push"
+CONF_POLL_SOCKETS = "poll_sockets"
 
 SCAN_INTERVAL_DEFINITIONS = 1800
 SCAN_INTERVAL_CACHE = 300
+SCAN_INTERVAL_APPARATUS_MIN = 1
+SCAN_INTERVAL_APPARATUS_MAX = 5
+
+# Target refresh interval in seconds, by attribute name (first match wins)
+APPARATUS_POLL_INTERVALS = {
+    "outputmode": 600,
+    "setpoint": 120,
+    "target_temperature": 120,
+    "operating_mode": 60,
+    "outputvalue": 5,
+    "_power": 5,
+    "current": 10,
+    "voltage": 10,
+    "frequency": 30,
+    "_temp": 30,
+    "co2_level": 30,
+    "_rpm": 30,
+}
+APPARATUS_POLL_INTERVAL_DEFAULT = 15
+# Attributes that receive pushed updates are only polled to verify them
+APPARATUS_POLL_INTERVAL_VERIFY = 300
+APPARATUS_POLL_INTERVAL_MIN = 2
+APPARATUS_POLL_ADAPT_FACTOR = 1.5
+APPARATUS_POLL_ADAPT_LIMIT = 4
+APPARATUS_POLL_LOOKAHEAD = 0.5
+# Seconds before attributes whose poll failed are requested again
+APPARATUS_POLL_RETRY_DELAY = 5
+
+STORAGE_VERSION = 1
+STORAGE_KEY_DISCOVERY = f"{DOMAIN}.discovery_{{}}"
+
+# Definitions to refresh before rediscovering entities, by event type
+DISCOVERY_EVENTS = {
+    OneSmartEventType.DISCOVERY_DEVICE_REGISTERED: [(OneSmartCommand.DEVICE,OneSmartAction.LIST)],
+    OneSmartEventType.ROOM_CREATE: [(OneSmartCommand.ROOM,OneSmartAction.LIST), (OneSmartCommand.PRESET,OneSmartAction.LIST)],
+    OneSmartEventType.ROOM_UPDATE: [(OneSmartCommand.ROOM,OneSmartAction.LIST), (OneSmartCommand.PRESET,OneSmartAction.LIST)],
+    OneSmartEventType.ROOM_DELETE: [(OneSmartCommand.ROOM,OneSmartAction.LIST), (OneSmartCommand.PRESET,OneSmartAction.LIST), (OneSmartCommand.DEVICE,OneSmartAction.LIST)],
+    OneSmartEventType.PRESET_DELETE: [(OneSmartCommand.PRESET,OneSmartAction.LIST)],
+    OneSmartEventType.METER_CREATE: [(OneSmartCommand.METER,OneSmartAction.LIST)],
+    OneSmartEventType.METER_UPDATE: [(OneSmartCommand.METER,OneSmartAction.LIST)],
+    OneSmartEventType.METER_DELETE: [(OneSmartCommand.METER,OneSmartAction.LIST)],
+}
 
 INTERVAL_TRACKER_DEFINITIONS = "track_interval_definitions"
 INTERVAL_TRACKER_POLL = "track_interval_poll"
 
+# Minimum change (absolute, relative) before a new reading is published, by attribute name
+VALUE_DEADBANDS = {
+    "_temp": (0.05, 0),
+    "_power": (0, 0.01),
+    "current": (0, 0.01),
+    "voltage": (0.5, 0),
+    "frequency": (0.02, 0),
+}
+ENERGY_CONSUMPTION_DEADBAND = (0, 0.01)
+
 MAX_TRANSACTION_ID = 65535
 BIT_LENGTH_DOUBLE = 64
 MAX_APPARATUS_POLL = 4
+APPARATUS_BATCH_SIZE_MIN = 1
+APPARATUS_BATCH_SIZE_MAX = 32
+APPARATUS_BATCH_LATENCY_BUDGET = 1.0
 PING_INTERVAL = 30
+PING_TIMEOUT = 5
+
+# Pushed events that replace all earlier events of their type, others are replaced per type and id
+EVENTS_SUPERSEDED_BY_TYPE = [
+    OneSmartEventType.ENERGY_CONSUMPTION,
+    OneSmartEventType.SITE_UPDATE,
+]
+# Pushed events that are merged per attribute instead of replaced
+EVENTS_MERGED = [
+    OneSmartEventType.DEVICE_DATA,
+    OneSmartEventType.DEVICE_STATUS,
+    OneSmartEventType.DEVICE_INPUT,
+]
+
+# Seconds to wait for a response by command, then by action, others wait SOCKET_COMMAND_TIMEOUT
+COMMAND_DEADLINES = {
+    OneSmartCommand.PING: PING_TIMEOUT,
+    OneSmartCommand.AUTHENTICATE: SOCKET_AUTHENTICATION_TIMEOUT,
+    OneSmartCommand.LOGBOOK: 60,
+    OneSmartCommand.UPGRADE: 120,
+}
+ACTION_DEADLINES = {
+    OneSmartAction.GET: 10,
+    OneSmartAction.SET: 10,
+    OneSmartAction.LIST: 30,
+    OneSmartAction.TOTAL: 30,
+}
 DEFAULT_PORT = 9010
 
 COMMAND_REPLACE_VALUE = 4294967296
+# Maximum number of queued commands per priority lane
+COMMAND_QUEUE_SIZES = {
+    OneSmartCommandPriority.INTERACTIVE: 64,
+    OneSmartCommandPriority.NORMAL: 64,
+    OneSmartCommandPriority.BACKGROUND: 128,
+}
+# Only the latest value per device attribute within this window is sent
+COMMAND_COALESCE_WINDOW = 0.1
+# Delay before a set value is verified by polling it
+COMMAND_CONFIRM_DELAY = 1
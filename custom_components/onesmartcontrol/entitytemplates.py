@@ -1,5 +1,23 @@
+import re
+from functools import lru_cache
+
 from homeassistant.const import (
-    Platform
+    Platform, ATTR_UNIT_OF_MEASUREMENT, ATTR_DEVICE_CLASS,
+    PERCENTAGE,
+    UnitOfTemperature,
+    UnitOfElectricPotential,
+    UnitOfElectricCurrent,
+    UnitOfEnergy,
+    UnitOfFrequency,
+    UnitOfVolume,
+    UnitOfTime,
+    UnitOfPower,
+    CONCENTRATION_PARTS_PER_MILLION,
+)
+from homeassistant.components.sensor import (
+    SensorDeviceClass, 
+    SensorStateClass,
+    ATTR_STATE_CLASS
 )
 from homeassistant.components.climate import (
     ATTR_HVAC_MODES, ATTR_HVAC_ACTION, HVACMode, HVACAction
@@ -66,4 +84,88 @@ ENTITY_TEMPLATES[Platform.WATER_HEATER] = [
             STATE_PERFORMANCE:"normal"
         }
     }
-]
\ No newline at end of file
+]
+
+# Templates with the attribute names they require, compiled once
+ENTITY_TEMPLATE_INDEX = [
+    (platform_name, entity_template, frozenset(value for value in entity_template.values() if isinstance(value, str)))
+    for platform_name in ENTITY_TEMPLATES
+    for entity_template in ENTITY_TEMPLATES[platform_name]
+]
+
+# Read only numeric attributes, first matching rule wins: (name pattern, device type, sensor properties)
+SENSOR_ATTRIBUTE_RULES = [
+    (re.compile(pattern), device_type, properties) for pattern, device_type, properties in [
+        ("_temp", None, {
+            ATTR_UNIT_OF_MEASUREMENT: UnitOfTemperature.CELSIUS,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.TEMPERATURE
+        }),
+        ("_percent|efficiency", None, {
+            ATTR_UNIT_OF_MEASUREMENT: PERCENTAGE
+        }),
+        ("co2_level", None, {
+            ATTR_UNIT_OF_MEASUREMENT: CONCENTRATION_PARTS_PER_MILLION,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.CO2
+        }),
+        ("_rpm", None, {
+            ATTR_UNIT_OF_MEASUREMENT: "rpm"
+        }),
+        ("flow_rate_4graph", None, {
+            ATTR_UNIT_OF_MEASUREMENT: f"{UnitOfVolume.LITERS}/{UnitOfTime.MINUTES}"
+        }),
+        ("_power.*reactive|reactive.*_power", None, {
+            ATTR_UNIT_OF_MEASUREMENT: None,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.POWER_FACTOR
+        }),
+        ("_power", None, {
+            ATTR_UNIT_OF_MEASUREMENT: UnitOfPower.WATT,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.POWER
+        }),
+        ("current", None, {
+            ATTR_UNIT_OF_MEASUREMENT: UnitOfElectricCurrent.AMPERE,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.CURRENT
+        }),
+        ("voltage", None, {
+            ATTR_UNIT_OF_MEASUREMENT: UnitOfElectricPotential.VOLT,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.VOLTAGE
+        }),
+        ("frequency", None, {
+            ATTR_UNIT_OF_MEASUREMENT: UnitOfFrequency.HERTZ,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.FREQUENCY
+        }),
+        ("^e_total$", None, {
+            ATTR_UNIT_OF_MEASUREMENT: UnitOfEnergy.KILO_WATT_HOUR,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
+            ATTR_STATE_CLASS: SensorStateClass.TOTAL
+        }),
+        ("^e_day$", None, {
+            ATTR_UNIT_OF_MEASUREMENT: UnitOfEnergy.KILO_WATT_HOUR,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
+            ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING
+        }),
+        ("_energy_", "ENERGY_PROCON_ATW", {
+            ATTR_UNIT_OF_MEASUREMENT: UnitOfEnergy.WATT_HOUR,
+            ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
+            ATTR_STATE_CLASS: SensorStateClass.TOTAL_INCREASING
+        }),
+    ]
+]
+
+"""Get the templates matching the attribute names of a device"""
+@lru_cache(maxsize=None)
+def match_entity_templates(attribute_names: frozenset) -> tuple:
+    return tuple(
+        (platform_name, entity_template, template_keys)
+        for platform_name, entity_template, template_keys in ENTITY_TEMPLATE_INDEX
+        if template_keys <= attribute_names
+    )
+
+"""Get the sensor properties of a read only numeric attribute, or None when it has no sensor"""
+@lru_cache(maxsize=None)
+def match_sensor_attribute(device_type, attribute_name: str):
+    for pattern, rule_device_type, properties in SENSOR_ATTRIBUTE_RULES:
+        if rule_device_type != None and rule_device_type != device_type:
+            continue
+        if pattern.search(attribute_name):
+            return properties
+    return None
@@ -1,6 +1,5 @@
 """Read and control One Smart Control lights"""
 from __future__ import annotations
-import json
 from homeassistant.config_entries import ConfigEntry
 
 
@@ -13,7 +12,7 @@ from homeassistant.components.light import (
 )
 from homeassistant.core import HomeAssistant
 
-from .onesmartentity import OneSmartEntity
+from .onesmartentity import OneSmartEntity, async_setup_discovered_entities
 from .onesmartwrapper import OneSmartWrapper
 
 from .const import * 
@@ -23,11 +22,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
 
     wrapper: OneSmartWrapper = hass.data[DOMAIN][entry.entry_id][ONESMART_WRAPPER]
 
-    entities = []
-    
-    wrapper_entities = wrapper.get_platform_entities(Platform.LIGHT)
-
-    for wrapper_entity in wrapper_entities:
+    def create_entity(wrapper_entity):
         optional_attributes = [
             CONF_DEVICE_ID, SERVICE_TURN_ON, SERVICE_TURN_OFF, STATE_OFF, ATTR_SUPPORTED_COLOR_MODES
         ]
@@ -36,24 +31,22 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
             if not optional_attribute in wrapper_entity:
                 wrapper_entity[optional_attribute] = None
 
-        entities.append(
-            OneSmartLight(
-                hass,
-                entry,
-                wrapper,
-                update_topic=wrapper_entity[OneSmartUpdateTopic],
-                source=wrapper_entity[ONESMART_CACHE],
-                key=wrapper_entity[ONESMART_KEY],
-                name=wrapper_entity[ATTR_NAME],
-                device_id=wrapper_entity[CONF_DEVICE_ID],
-                color_modes=wrapper_entity[ATTR_SUPPORTED_COLOR_MODES],
-                command_on=wrapper_entity[SERVICE_TURN_ON],
-                command_off=wrapper_entity[SERVICE_TURN_OFF],
-                state_off=wrapper_entity[STATE_OFF]
-            )
+        return OneSmartLight(
+            hass,
+            entry,
+            wrapper,
+            update_topic=wrapper_entity[OneSmartUpdateTopic],
+            source=wrapper_entity[ONESMART_CACHE],
+            key=wrapper_entity[ONESMART_KEY],
+            name=wrapper_entity[ATTR_NAME],
+            device_id=wrapper_entity[CONF_DEVICE_ID],
+            color_modes=wrapper_entity[ATTR_SUPPORTED_COLOR_MODES],
+            command_on=wrapper_entity[SERVICE_TURN_ON],
+            command_off=wrapper_entity[SERVICE_TURN_OFF],
+            state_off=wrapper_entity[STATE_OFF]
         )
 
-    async_add_entities(entities)
+    async_setup_discovered_entities(hass, entry, wrapper, Platform.LIGHT, async_add_entities, create_entity)
     
 class OneSmartLight(OneSmartEntity, LightEntity):
     def __init__(
@@ -106,17 +99,17 @@ class OneSmartLight(OneSmartEntity, LightEntity):
     @property
     def available(self) -> bool:
         value = self.get_cache_value(self._key)
-        return value is not None
+        return super().available and value is not None
 
     async def async_turn_on(self, **kwargs):
+        attributes = self._command_on[OneSmartFieldName.ATTRIBUTES]
         if ColorMode.BRIGHTNESS in self._attr_supported_color_modes:
             brightness = kwargs.get(ATTR_BRIGHTNESS, 255)
-            command_on = json.loads(json.dumps(self._command_on).replace(f"{COMMAND_REPLACE_VALUE}",f"{brightness}"))
-            await self.wrapper.command(SOCKET_PUSH, **command_on)
-        else:
-            await self.wrapper.command(SOCKET_PUSH, **self._command_on)
-        self.wrapper.set_update_flag(self._source)
+            attributes = {
+                attribute_name: brightness if value == COMMAND_REPLACE_VALUE else value
+                for attribute_name, value in attributes.items()
+            }
+        await self.wrapper.set_apparatus(self._command_on[OneSmartFieldName.ID], attributes)
 
     async def async_turn_off(self, **kwargs):
-        await self.wrapper.command(SOCKET_PUSH, **self._command_off)
-        self.wrapper.set_update_flag(self._source)
\ No newline at end of file
+        await self.wrapper.set_apparatus(self._command_off[OneSmartFieldName.ID], self._command_off[OneSmartFieldName.ATTRIBUTES])
\ No newline at end of file
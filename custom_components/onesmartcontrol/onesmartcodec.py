@@ -0,0 +1,39 @@
+"""One Smart Control JSON codec, using the fastest available JSON library"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    CODEC_NAME = "orjson"
+    DecodeError = orjson.JSONDecodeError
+
+    def encode(message) -> bytes:
+        # Field names are str enums, which orjson only accepts as keys with this option
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+
+    decode = orjson.loads
+
+elif msgspec is not None:
+    CODEC_NAME = "msgspec"
+    DecodeError = msgspec.DecodeError
+
+    encode = msgspec.json.Encoder().encode
+    decode = msgspec.json.Decoder().decode
+
+else:
+    CODEC_NAME = "json"
+    # Bytes that are not valid UTF-8 raise a UnicodeDecodeError instead of a JSONDecodeError, both are ValueErrors
+    DecodeError = ValueError
+
+    def encode(message) -> bytes:
+        return json.dumps(message).encode()
+
+    decode = json.loads
@@ -1,18 +1,29 @@
+from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import Entity, DeviceInfo
+from .onesmartmodels import Device, Room
 from .onesmartwrapper import OneSmartWrapper
 from .const import *
 
 
 class OneSmartEntity(Entity):
-    def __init__(self, hass: HomeAssistant, config_entry, wrapper: OneSmartWrapper, update_topic, source, device_id: str, name: str, suffix: str, icon: str):
+    def __init__(self, hass: HomeAssistant, config_entry, wrapper: OneSmartWrapper, update_topic, source, device_id: str, name: str, suffix: str, icon: str, update_target = None):
         self.hass = hass
         self.config_entry = config_entry
         self.wrapper = wrapper
         self.update_topic = update_topic
         self.update_topic_listener = None
 
+        # Only listen for updates of our own device (or meter) when there is one
+        if update_target == None:
+            update_target = device_id
+        if update_target != None:
+            self.update_signal = OneSmartUpdateTopic(update_topic).target(update_target)
+        else:
+            self.update_signal = update_topic
+
         self._source = source
 
         self._name = name
@@ -26,16 +37,15 @@ class OneSmartEntity(Entity):
             self._device_id = device_id
             devices = wrapper.get_cache((OneSmartCommand.DEVICE,OneSmartAction.LIST))
             rooms = wrapper.get_cache((OneSmartCommand.ROOM,OneSmartAction.LIST))
-            self._device: dict = devices.get(device_id)
-            room_id = self._device.get(OneSmartFieldName.ROOM, None)
-            self._room: dict = rooms.get(room_id, None)
+            self._device: Device = devices.get(device_id)
+            self._room: Room = rooms.get(self._device.room, None)
             url = None
 
             identifiers = {(DOMAIN, self._device_id)}
-            device_name = self._device.get(OneSmartFieldName.NAME, None)
-            model = self._device.get(OneSmartFieldName.TYPE, None)
+            device_name = self._device.name
+            model = self._device.type
             if self._room:
-                room_name = self._room.get(OneSmartFieldName.NAME, None)
+                room_name = self._room.name
             else:
                 room_name = None
         else:
@@ -62,23 +72,29 @@ class OneSmartEntity(Entity):
         )
 
         self._cache = wrapper.get_cache(source)
+        self._cache_paths = dict()
+        self._last_cache_values = None
 
     async def async_added_to_hass(self):
         @callback
         def update():
             self.update_from_latest_data()
-            self.async_write_ha_state()
+            if self.cache_values_changed():
+                self.async_write_ha_state()
 
         await super().async_added_to_hass()
         self.update_topic_listener = async_dispatcher_connect(
-            self.hass, self.update_topic, update
+            self.hass, self.update_signal, update
         )
         self.async_on_remove(self.update_topic_listener)
+        self.async_on_remove(async_dispatcher_connect(
+            self.hass, OneSmartUpdateTopic.CONNECTION.target(self.config_entry.entry_id), self.async_write_ha_state
+        ))
         self.update_from_latest_data()
 
     @property
     def available(self) -> bool:
-        return self.wrapper.is_connected()
+        return self.wrapper.available
 
     @property
     def should_poll(self) -> bool:
@@ -107,24 +123,106 @@ class OneSmartEntity(Entity):
         self._cache = self.wrapper.get_cache(self._source)
         
     def get_cache_value(self, key):
-        if self.cache == None:
-            return None
-        
-        value = self.cache
-        
-        if len(value) == 0:
+        # Resolve the dotted key only once per entity
+        path = self._cache_paths.get(key)
+        if path is None:
+            path = compile_cache_key(key)
+            self._cache_paths[key] = path
+
+        value = self._cache
+        if not value:
             return None
-        else:
-            node: str
-            for node in key.split("."):
-                if node.isdigit():
-                    node = int(node)
-                if value == None:
-                    return None
-                elif node in value:
-                    value = value[node]
-                    continue
-                else:
-                    value = None
-
-        return value
\ No newline at end of file
+
+        for node in path:
+            if value is None:
+                return None
+            elif isinstance(value, dict):
+                value = value.get(node, None)
+            else:
+                value = getattr(value, node, None)
+
+        return value
+
+    def cache_values_changed(self) -> bool:
+        # Compare every cache value the entity has read so far, they make up its state
+        values = tuple(self.get_cache_value(key) for key in self._cache_paths)
+        if values == self._last_cache_values:
+            return False
+        self._last_cache_values = values
+        return True
+
+
+def async_setup_discovered_entities(hass: HomeAssistant, config_entry, wrapper: OneSmartWrapper, platform: Platform, async_add_entities, create_entity):
+    """Add the entities the wrapper discovers for a platform, now and whenever rediscovery finds new or changed ones"""
+    entities = dict()
+
+    @callback
+    def add_entities(wrapper_entities):
+        new_entities = []
+        for wrapper_entity in wrapper_entities:
+            identity = wrapper.get_entity_identity(wrapper_entity)
+            if identity in entities:
+                continue
+            # The platforms fill in missing optional keys, keep the wrapper's description unchanged to compare it later
+            entity = create_entity(dict(wrapper_entity))
+            entities[identity] = entity
+            new_entities.append(entity)
+
+        if len(new_entities) > 0:
+            async_add_entities(new_entities)
+
+    @callback
+    def remove_entities(wrapper_entities):
+        entity_registry = er.async_get(hass)
+        for wrapper_entity in wrapper_entities:
+            entity = entities.pop(wrapper.get_entity_identity(wrapper_entity), None)
+            if entity == None or entity.hass == None:
+                continue
+
+            # Removing the registry entry also removes the entity from its platform
+            if entity_registry.async_get(entity.entity_id) != None:
+                entity_registry.async_remove(entity.entity_id)
+            else:
+                hass.async_create_task(entity.async_remove(force_remove=True))
+
+    async def replace_entity(entity, new_entity):
+        # Only the entity itself is removed, the new one takes over its registry entry
+        await entity.async_remove(force_remove=True)
+        async_add_entities([new_entity])
+
+    @callback
+    def replace_entities(wrapper_entities):
+        for wrapper_entity in wrapper_entities:
+            identity = wrapper.get_entity_identity(wrapper_entity)
+            entity = entities.pop(identity, None)
+            new_entity = create_entity(dict(wrapper_entity))
+            entities[identity] = new_entity
+
+            if entity == None or entity.hass == None:
+                async_add_entities([new_entity])
+            else:
+                hass.async_create_task(replace_entity(entity, new_entity))
+
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, OneSmartUpdateTopic.DISCOVERY.target(platform), add_entities)
+    )
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, OneSmartUpdateTopic.REMOVE.target(platform), remove_entities)
+    )
+    config_entry.async_on_unload(
+        async_dispatcher_connect(hass, OneSmartUpdateTopic.REPLACE.target(platform), replace_entities)
+    )
+    add_entities(wrapper.get_platform_entities(platform))
+
+
+def compile_cache_key(key) -> tuple:
+    """Split a dotted cache key into the dict keys and attribute names to traverse"""
+    if not isinstance(key, str):
+        return (key,)
+
+    path = []
+    for node in key.split("."):
+        if node.isdigit():
+            node = int(node)
+        path.append(node)
+    return tuple(path)
@@ -0,0 +1,74 @@
+"""One Smart Control coalescing queue for pushed events"""
+from itertools import count
+
+from .const import *
+
+
+class OneSmartEventQueue:
+    def __init__(self, max_size = SOCKET_EVENT_QUEUE_SIZE):
+        self._max_size = max_size
+        # Events by coalescing key, in the order their latest version arrived
+        self._events = dict()
+        self._sequence = count()
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    """Get the key under which a later event supersedes an earlier one"""
+    def get_key(self, event):
+        event_type = event.get(OneSmartFieldName.EVENT)
+        data = event.get(OneSmartFieldName.DATA)
+
+        if event_type in EVENTS_SUPERSEDED_BY_TYPE:
+            return (event_type, None)
+        elif isinstance(data, dict) and data.get(OneSmartFieldName.ID) != None:
+            return (event_type, data[OneSmartFieldName.ID])
+        else:
+            # Events without an id are never coalesced
+            return next(self._sequence)
+
+    """Combine device events, so attributes only present in the earlier event keep their value"""
+    def merge(self, previous, event):
+        if not event.get(OneSmartFieldName.EVENT) in EVENTS_MERGED:
+            return event
+
+        previous_data = previous[OneSmartFieldName.DATA]
+        data = event[OneSmartFieldName.DATA]
+        previous_attributes = previous_data.get(OneSmartFieldName.ATTRIBUTES)
+        attributes = data.get(OneSmartFieldName.ATTRIBUTES)
+        if isinstance(previous_attributes, dict) and isinstance(attributes, dict):
+            data = data | { OneSmartFieldName.ATTRIBUTES: previous_attributes | attributes }
+        else:
+            data = previous_data | data
+        return event | { OneSmartFieldName.DATA: data }
+
+    """Add an event, replacing the event it supersedes or dropping the oldest event when the queue is full"""
+    def put(self, event):
+        self.received += 1
+        key = self.get_key(event)
+
+        if key in self._events:
+            event = self.merge(self._events.pop(key), event)
+            self.coalesced += 1
+        elif len(self._events) >= self._max_size:
+            self._events.pop(next(iter(self._events)))
+            self.dropped += 1
+
+        self._events[key] = event
+
+    """Return the queued events and clear the queue"""
+    def get_all(self) -> list:
+        events = list(self._events.values())
+        self._events.clear()
+        return events
+
+    def get_metrics(self) -> dict:
+        return {
+            "queued": len(self._events),
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped
+        }
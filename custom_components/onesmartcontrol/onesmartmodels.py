@@ -0,0 +1,99 @@
+"""One Smart Control data models"""
+from .const import *
+
+
+class Device:
+    __slots__ = ("id", "name", "type", "group", "room", "visible")
+
+    def __init__(self, id, name, type=None, group=None, room=None, visible=True):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.group = group
+        self.room = room
+        self.visible = visible
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            id=data[OneSmartFieldName.ID],
+            name=data.get(OneSmartFieldName.NAME),
+            type=data.get(OneSmartFieldName.TYPE),
+            group=data.get(OneSmartFieldName.GROUP),
+            room=data.get(OneSmartFieldName.ROOM),
+            visible=data.get(OneSmartFieldName.VISIBLE, True)
+        )
+
+
+class Room:
+    __slots__ = ("id", "name", "visible")
+
+    def __init__(self, id, name, visible=True):
+        self.id = id
+        self.name = name
+        self.visible = visible
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            id=data[OneSmartFieldName.ID],
+            name=data.get(OneSmartFieldName.NAME),
+            visible=data.get(OneSmartFieldName.VISIBLE, True)
+        )
+
+
+class Preset:
+    __slots__ = ("id", "name", "room", "group", "type", "active")
+
+    def __init__(self, id, name, room=None, group=None, type=None, active=False):
+        self.id = id
+        self.name = name
+        self.room = room
+        self.group = group
+        self.type = type
+        self.active = active
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            id=data[OneSmartFieldName.ID],
+            name=data.get(OneSmartFieldName.NAME),
+            room=data.get(OneSmartFieldName.ROOM),
+            group=data.get(OneSmartFieldName.GROUP),
+            type=data.get(OneSmartFieldName.TYPE),
+            active=data.get(OneSmartFieldName.ACTIVE, False)
+        )
+
+
+class Meter:
+    __slots__ = ("id", "name")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            id=data[OneSmartFieldName.ID],
+            name=data.get(OneSmartFieldName.NAME)
+        )
+
+
+class ApparatusAttribute:
+    __slots__ = ("name", "access", "type", "enum")
+
+    def __init__(self, name, access, type, enum=None):
+        self.name = name
+        self.access = access
+        self.type = type
+        self.enum = enum
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            name=data[OneSmartFieldName.NAME],
+            access=data.get(OneSmartFieldName.ACCESS),
+            type=data.get(OneSmartFieldName.TYPE),
+            enum=data.get(OneSmartFieldName.ENUM)
+        )
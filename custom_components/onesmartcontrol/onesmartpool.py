@@ -0,0 +1,102 @@
+"""One Smart Control pool of poll connections"""
+import asyncio
+import logging
+from functools import partial
+
+from .const import *
+from .onesmartqueue import OneSmartCommandQueue
+from .onesmartsocket import OneSmartSocket
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class OneSmartPoolConnection:
+    __slots__ = ("socket", "command_queue", "in_flight", "failures", "sent")
+
+    def __init__(self, socket: OneSmartSocket, command_queue: OneSmartCommandQueue):
+        self.socket = socket
+        self.command_queue = command_queue
+        self.in_flight = 0
+        self.failures = 0
+        self.sent = 0
+
+    @property
+    def is_healthy(self):
+        return self.socket.is_connected and self.failures < SOCKET_POOL_MAX_FAILURES
+
+    def as_dict(self) -> dict:
+        return {
+            "connected": self.socket.is_connected,
+            "healthy": self.is_healthy,
+            "in_flight": self.in_flight,
+            "failures": self.failures,
+            "sent": self.sent
+        }
+
+
+class OneSmartSocketPool:
+    def __init__(self):
+        self._connections = dict()
+
+    def add(self, socket_name, socket: OneSmartSocket, command_queue: OneSmartCommandQueue):
+        self._connections[socket_name] = OneSmartPoolConnection(socket, command_queue)
+
+    @property
+    def socket_names(self) -> list:
+        return list(self._connections)
+
+    @property
+    def is_available(self):
+        return any(connection.is_healthy for connection in self._connections.values())
+
+    """Get the connections that failed too often or lost their connection"""
+    def get_unhealthy(self) -> list:
+        return [socket_name for socket_name, connection in self._connections.items() if not connection.is_healthy]
+
+    """Forget the failures of a connection, e.g. after it reconnected"""
+    def reset(self, socket_name):
+        connection = self._connections.get(socket_name)
+        if connection is not None:
+            connection.failures = 0
+
+    """Select the healthy connection with the fewest commands queued or awaiting a response"""
+    def get_least_loaded(self) -> str:
+        candidates = [socket_name for socket_name, connection in self._connections.items() if connection.is_healthy]
+        if len(candidates) == 0:
+            candidates = [socket_name for socket_name, connection in self._connections.items() if connection.socket.is_connected]
+        if len(candidates) == 0:
+            candidates = self.socket_names
+
+        return min(candidates, key=lambda socket_name: self._connections[socket_name].in_flight)
+
+    """Queue a command on the least loaded connection and return the transaction future once it is sent"""
+    async def send_cmd(self, command, priority = OneSmartCommandPriority.NORMAL, **kwargs) -> asyncio.Future:
+        socket_name = self.get_least_loaded()
+        connection = self._connections[socket_name]
+        connection.in_flight += 1
+        try:
+            transaction = await connection.command_queue.send_cmd(command, priority, **kwargs)
+        except BaseException:
+            connection.in_flight -= 1
+            raise
+
+        connection.sent += 1
+        if transaction is None:
+            # Fire-and-forget commands are not tracked
+            connection.in_flight -= 1
+        else:
+            transaction.add_done_callback(partial(self._transaction_done, connection))
+        return transaction
+
+    """Track the load and health of a connection as its transactions complete"""
+    def _transaction_done(self, connection: OneSmartPoolConnection, transaction: asyncio.Future):
+        connection.in_flight -= 1
+        # Cancelled transactions were abandoned after a timeout, a missing result means the connection dropped
+        if transaction.cancelled() or transaction.exception() != None or transaction.result() == None:
+            connection.failures += 1
+        else:
+            connection.failures = 0
+
+    """Get the load and health per connection"""
+    def get_metrics(self) -> dict:
+        return {socket_name: connection.as_dict() for socket_name, connection in self._connections.items()}
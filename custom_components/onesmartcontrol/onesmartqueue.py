@@ -0,0 +1,124 @@
+"""One Smart Control prioritized command queue"""
+import asyncio
+import logging
+from itertools import count
+from time import monotonic
+
+from .const import *
+from .onesmartsocket import OneSmartSocket
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CommandLaneMetrics:
+    __slots__ = ("submitted", "dispatched", "abandoned", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.submitted = 0
+        self.dispatched = 0
+        self.abandoned = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self, queued) -> dict:
+        return {
+            "queued": queued,
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "abandoned": self.abandoned,
+            "wait_average": self.wait_total / self.dispatched if self.dispatched > 0 else 0.0,
+            "wait_max": self.wait_max
+        }
+
+
+class OneSmartCommandQueue:
+    def __init__(self, socket: OneSmartSocket):
+        self._socket = socket
+        self._queue = asyncio.PriorityQueue()
+        self._sequence = count()
+        self._task = None
+
+        # Bound every lane, senders wait for a free slot when their lane is full
+        self._slots = {priority: asyncio.Semaphore(COMMAND_QUEUE_SIZES[priority]) for priority in OneSmartCommandPriority}
+        self._queued = {priority: 0 for priority in OneSmartCommandPriority}
+        self._metrics = {priority: CommandLaneMetrics() for priority in OneSmartCommandPriority}
+
+    """Queue a command and return its transaction future once it has been sent"""
+    async def send_cmd(self, command, priority = OneSmartCommandPriority.NORMAL, **kwargs) -> asyncio.Future:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        await self._slots[priority].acquire()
+        dispatched = asyncio.get_running_loop().create_future()
+        self._queued[priority] += 1
+        self._metrics[priority].submitted += 1
+        self._queue.put_nowait((priority, next(self._sequence), monotonic(), command, kwargs, dispatched))
+
+        return await dispatched
+
+    """Send queued commands in priority order as the socket's pipeline window allows"""
+    async def _run(self):
+        while True:
+            # Take a slot in the pipeline window first, so the command is picked by priority once a slot is free
+            await self._socket.acquire_slot()
+            try:
+                priority, _, queued_at, command, kwargs, dispatched = await self._queue.get()
+            except BaseException:
+                self._socket.release_slot()
+                raise
+            self._queued[priority] -= 1
+            self._slots[priority].release()
+
+            metrics = self._metrics[priority]
+            if dispatched.done():
+                # The sender gave up while the command was queued
+                self._socket.release_slot()
+                metrics.abandoned += 1
+                continue
+
+            try:
+                if kwargs.get("forget"):
+                    # Fire-and-forget commands need no slot
+                    self._socket.release_slot()
+                    transaction = await self._socket.send_cmd(command, **kwargs)
+                else:
+                    transaction = await self._socket.send_acquired(command, **kwargs)
+            except asyncio.CancelledError:
+                dispatched.cancel()
+                raise
+            except Exception as e:
+                if not dispatched.done():
+                    dispatched.set_exception(e)
+                continue
+
+            wait = monotonic() - queued_at
+            metrics.dispatched += 1
+            metrics.wait_total += wait
+            metrics.wait_max = max(metrics.wait_max, wait)
+
+            if dispatched.done():
+                metrics.abandoned += 1
+                if transaction is not None:
+                    transaction.cancel()
+            else:
+                dispatched.set_result(transaction)
+
+    """Get the queue length and wait times per lane"""
+    def get_metrics(self) -> dict:
+        return {
+            priority.name.lower(): self._metrics[priority].as_dict(self._queued[priority])
+            for priority in OneSmartCommandPriority
+        }
+
+    """Stop sending and fail the queued commands"""
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        while not self._queue.empty():
+            priority, _, _, _, _, dispatched = self._queue.get_nowait()
+            self._queued[priority] -= 1
+            self._slots[priority].release()
+            if not dispatched.done():
+                dispatched.cancel()
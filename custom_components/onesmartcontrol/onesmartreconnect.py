@@ -0,0 +1,33 @@
+"""One Smart Control reconnect backoff and circuit breaker"""
+from random import uniform
+
+from .const import *
+
+
+class OneSmartReconnectBackoff:
+    def __init__(self):
+        self.failures = 0
+        self.state = OneSmartCircuitState.CLOSED
+
+    """Note that the connection dropped, the first attempt to reconnect is made right away"""
+    def disconnected(self):
+        if self.state == OneSmartCircuitState.CLOSED:
+            self.failures = 0
+            self.state = OneSmartCircuitState.HALF_OPEN
+
+    """Get the delay before the next attempt, doubling per failed attempt with jitter to spread the reconnects"""
+    def get_delay(self) -> float:
+        if self.failures == 0:
+            return 0
+        delay = min(SOCKET_RECONNECT_DELAY_BASE * 2 ** (self.failures - 1), SOCKET_RECONNECT_DELAY_MAX)
+        return uniform(delay * (1 - SOCKET_RECONNECT_JITTER), delay)
+
+    """Open the circuit after too many failed attempts in a row"""
+    def failed(self):
+        self.failures += 1
+        if self.failures >= SOCKET_CIRCUIT_FAILURES:
+            self.state = OneSmartCircuitState.OPEN
+
+    def succeeded(self):
+        self.failures = 0
+        self.state = OneSmartCircuitState.CLOSED
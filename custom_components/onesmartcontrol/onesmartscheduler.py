@@ -0,0 +1,134 @@
+"""One Smart Control apparatus poll scheduler"""
+from .const import *
+
+
+class ApparatusPollState:
+    __slots__ = ("base_interval", "interval", "next_due")
+
+    def __init__(self, base_interval, next_due):
+        self.base_interval = base_interval
+        self.interval = base_interval
+        self.next_due = next_due
+
+
+class OneSmartPollScheduler:
+    def __init__(self):
+        self._schedule = dict()
+
+    """Set the attributes to poll for a device, keeping the learned state of known attributes"""
+    def set_attributes(self, device_id, attribute_names, now = 0):
+        device_schedule = self._schedule.get(device_id, dict())
+        self._schedule[device_id] = {
+            attribute_name: device_schedule.get(attribute_name) or ApparatusPollState(self.get_base_interval(attribute_name), now)
+            for attribute_name in attribute_names
+        }
+
+    def remove_device(self, device_id):
+        self._schedule.pop(device_id, None)
+
+    """Get the target refresh interval for an attribute from its name"""
+    def get_base_interval(self, attribute_name):
+        for name_part, interval in APPARATUS_POLL_INTERVALS.items():
+            if name_part in attribute_name:
+                return interval
+        return APPARATUS_POLL_INTERVAL_DEFAULT
+
+    """Select the attributes to request per device, most overdue first"""
+    def get_due(self, now, get_batch_size) -> list:
+        poll_requests = []
+        for device_id, device_schedule in self._schedule.items():
+            batch_size = get_batch_size(device_id)
+            due = [
+                (state.next_due, attribute_name) for attribute_name, state in device_schedule.items()
+                if state.next_due <= now
+            ]
+            if len(due) == 0:
+                continue
+
+            # Fill the rest of the request with attributes that are due soon
+            if len(due) < batch_size:
+                due += [
+                    (state.next_due, attribute_name) for attribute_name, state in device_schedule.items()
+                    if now < state.next_due <= now + state.interval * APPARATUS_POLL_LOOKAHEAD
+                ]
+
+            due.sort()
+            attribute_names = [attribute_name for _, attribute_name in due[:batch_size]]
+            for attribute_name in attribute_names:
+                state = device_schedule[attribute_name]
+                state.next_due = now + state.interval
+
+            poll_requests.append((device_id, attribute_names))
+
+        return poll_requests
+
+    """Adapt the interval of an attribute to how often its value changes"""
+    def observe(self, device_id, attribute_name, changed: bool):
+        state = self._schedule.get(device_id, dict()).get(attribute_name)
+        if state is None:
+            return
+
+        if changed:
+            interval = state.interval / APPARATUS_POLL_ADAPT_FACTOR
+            interval = max(interval, state.base_interval / APPARATUS_POLL_ADAPT_LIMIT, APPARATUS_POLL_INTERVAL_MIN)
+        else:
+            interval = state.interval * APPARATUS_POLL_ADAPT_FACTOR
+            interval = min(interval, state.base_interval * APPARATUS_POLL_ADAPT_LIMIT)
+
+        # Move the deadline along with the new interval
+        state.next_due += interval - state.interval
+        state.interval = interval
+
+    """Slow down polling of attributes that receive pushed updates, a push counts as a fresh poll"""
+    def set_pushed(self, device_id, attribute_names, now):
+        device_schedule = self._schedule.get(device_id, dict())
+        for attribute_name in attribute_names:
+            state = device_schedule.get(attribute_name)
+            if state is None:
+                continue
+
+            if state.base_interval < APPARATUS_POLL_INTERVAL_VERIFY:
+                state.base_interval = APPARATUS_POLL_INTERVAL_VERIFY
+                state.interval = APPARATUS_POLL_INTERVAL_VERIFY
+            state.next_due = max(state.next_due, now + state.interval)
+
+    """Poll attributes no later than the given time, e.g. to confirm a value that was set"""
+    def expedite(self, device_id, attribute_names, due):
+        device_schedule = self._schedule.get(device_id, dict())
+        for attribute_name in attribute_names:
+            state = device_schedule.get(attribute_name)
+            if state is not None:
+                state.next_due = min(state.next_due, due)
+
+    """Poll all attributes no later than the given time, e.g. after pushed updates may have been missed"""
+    def expedite_all(self, due):
+        for device_schedule in self._schedule.values():
+            for state in device_schedule.values():
+                state.next_due = min(state.next_due, due)
+
+    """Get the time at which the next attribute is due"""
+    def next_due(self):
+        return min(
+            (state.next_due for device_schedule in self._schedule.values() for state in device_schedule.values()),
+            default=None
+        )
+
+
+class OneSmartBatchSizer:
+    def __init__(self):
+        self._sizes = dict()
+
+    """Get the number of attributes to request at once from a device type"""
+    def get_size(self, device_type) -> int:
+        return self._sizes.get(device_type, MAX_APPARATUS_POLL)
+
+    """Grow the batch size while responses are fast, halve it when the gateway struggles"""
+    def observe(self, device_type, requested: int, response_time, error_code = None):
+        size = self.get_size(device_type)
+
+        if response_time == None or error_code in [OneSmartErrorCode.TIMEOUT, OneSmartErrorCode.REMOTE_SYSTEM_ERROR]:
+            size = max(size // 2, APPARATUS_BATCH_SIZE_MIN)
+        elif error_code == None and requested >= size and response_time <= APPARATUS_BATCH_LATENCY_BUDGET:
+            size = min(size + 1, APPARATUS_BATCH_SIZE_MAX)
+
+        self._sizes[device_type] = size
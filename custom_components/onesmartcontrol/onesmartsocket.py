@@ -1,16 +1,19 @@
 """One Smart Control JSON-RPC Socket implementation"""
 import asyncio
+from functools import partial
 from hashlib import sha1
-import json
 import logging
 import ssl
+from time import monotonic
 from .const import *
+from . import onesmartcodec as codec
+from .onesmartevents import OneSmartEventQueue
 
 _LOGGER = logging.getLogger(__name__)
 
 class OneSmartSocket:
 
-    def __init__(self):
+    def __init__(self, max_in_flight = SOCKET_PIPELINE_WINDOW):
         # Initialize SSLContext without certificate checking
         self._ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
         self._ssl_context.check_hostname = False
@@ -18,24 +21,41 @@ class OneSmartSocket:
 
         self._reader = None
         self._writer = None
+        self._read_task = None
 
         # Allow old ciphers
         self._ssl_context.set_ciphers('DEFAULT')
 
         # Initialize caches
-        self._response_cache = dict()
-        self._event_cache = []
+        self._transactions = dict()
+        self._deadlines = dict()
+        # Transactions given up on and fire-and-forget commands, by the time they were abandoned or sent
+        self._abandoned = dict()
+        self._unclaimed = dict()
+        self.expired_transactions = 0
+        self.late_replies = 0
+        self.unknown_replies = 0
+        self._event_queue = OneSmartEventQueue()
+        self._event_received = asyncio.Event()
+        self._last_received = monotonic()
+
+        # Limit the number of transactions awaiting a response
+        self._in_flight = asyncio.Semaphore(max_in_flight)
 
     async def connect(self, host, port):
         if self._writer:
             try:
-                self.close()
+                await self.close()
             except:
                 pass
 
-        self._reader, self._writer = await asyncio.open_connection(host, port, ssl=self._ssl_context)
+        self._reader, self._writer = await asyncio.open_connection(host, port, ssl=self._ssl_context, limit=SOCKET_READ_LIMIT)
 
         self._transaction_count = 0
+        self._abandoned.clear()
+        self._unclaimed.clear()
+        self._last_received = monotonic()
+        self._read_task = asyncio.create_task(self._read_loop())
         return self.is_connected
 
     async def authenticate(self, username, password):
@@ -43,6 +63,11 @@ class OneSmartSocket:
         return await self.send_cmd(command=OneSmartCommand.AUTHENTICATE, username=username, password=password_hash)
 
     async def close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        self._abort_transactions()
+
         try:
             self._writer.close()
             await self._writer.wait_closed()
@@ -57,79 +82,210 @@ class OneSmartSocket:
             return False
         elif self._reader.at_eof() or self._writer.is_closing():
             return False
+        elif self._read_task is None or self._read_task.done():
+            return False
         else:
             return True
 
-    """Start a new transaction"""
-    async def send_cmd(self, command, **kwargs):
-        self._transaction_count += 1
-        transaction_id = self._transaction_count
-        rpc_message = { OneSmartFieldName.COMMAND:command, OneSmartFieldName.TRANSACTION:transaction_id } | kwargs
-        rpc_data = json.dumps(rpc_message) + "\r\n"
-        self._writer.write(rpc_data.encode())
+    """Seconds since anything was received, any message shows the connection is alive"""
+    @property
+    def idle_time(self):
+        return monotonic() - self._last_received
+
+    """Start a new transaction and return a future resolving to the response, or to None when it passes its deadline"""
+    async def send_cmd(self, command, deadline = None, forget = False, **kwargs):
+        # Fire-and-forget commands take no slot in the pipeline window and return no future
+        if forget:
+            transaction_id = self._next_transaction_id()
+            self._remember(self._unclaimed, transaction_id)
+            await self._write({ OneSmartFieldName.COMMAND:command, OneSmartFieldName.TRANSACTION:transaction_id } | kwargs)
+            return None
+
+        await self.acquire_slot()
+        return await self.send_acquired(command, deadline, **kwargs)
+
+    """Wait for a free slot in the pipeline window"""
+    async def acquire_slot(self):
+        await self._in_flight.acquire()
+
+    """Return a slot that was acquired but not used for a transaction"""
+    def release_slot(self):
+        self._in_flight.release()
+
+    """Start a transaction in a slot acquired before, the slot is released when the transaction completes"""
+    async def send_acquired(self, command, deadline = None, **kwargs):
+        if deadline == None:
+            deadline = self.get_deadline(command, kwargs.get(OneSmartFieldName.ACTION))
+
+        transaction_id = self._next_transaction_id()
+        loop = asyncio.get_running_loop()
+        transaction = loop.create_future()
+        self._transactions[transaction_id] = transaction
+        self._deadlines[transaction_id] = loop.call_later(deadline, self._expire_transaction, transaction_id)
+        transaction.add_done_callback(partial(self._release_transaction, transaction_id))
+
+        try:
+            await self._write({ OneSmartFieldName.COMMAND:command, OneSmartFieldName.TRANSACTION:transaction_id } | kwargs)
+        except:
+            transaction.cancel()
+            raise
+
+        return transaction
+
+    async def _write(self, rpc_message):
+        rpc_data = codec.encode(rpc_message) + SOCKET_MESSAGE_SEPARATOR
+        self._writer.write(rpc_data)
         await self._writer.drain()
-        self._response_cache[transaction_id] = None
 
-        return transaction_id
-    
+    """Allocate the next transaction id within the protocol limit, skipping ids that may still get a reply"""
+    def _next_transaction_id(self):
+        # The tables are bounded far below the id range, so a free id is always found
+        while True:
+            self._transaction_count = self._transaction_count % MAX_TRANSACTION_ID + 1
+            transaction_id = self._transaction_count
+            if not (transaction_id in self._transactions or transaction_id in self._abandoned or transaction_id in self._unclaimed):
+                return transaction_id
+
+    """Get the seconds to wait for the response to a command"""
+    @staticmethod
+    def get_deadline(command, action = None):
+        if command in COMMAND_DEADLINES:
+            return COMMAND_DEADLINES[command]
+        return ACTION_DEADLINES.get(action, SOCKET_COMMAND_TIMEOUT)
+
     async def ping(self):
         return await self.send_cmd(command=OneSmartCommand.PING)
 
-    """Fetch outstanding responses and cache them by transaction ID"""
-    async def get_responses(self):
-        data = bytes()
-    
-        done_reading = False
-        # Stitch split packages
-        while not done_reading:
-            read_bytes = await self._reader.read(SOCKET_BUFFER_SIZE)
-            if len(read_bytes) == 0:
-                # No data available
-                break
-            elif len(read_bytes) == SOCKET_BUFFER_SIZE:
-                data += read_bytes
-                #_LOGGER.debug(f"Packet is { len(data) } bytes, waiting for more")
+    """Background task resolving transactions as their responses arrive"""
+    async def _read_loop(self):
+        try:
+            async for message in self.read_messages():
+                self._last_received = monotonic()
+                self._dispatch_message(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _LOGGER.warning(f"Socket reader stopped: { e }")
+        finally:
+            self._abort_transactions()
+            # Wake up event listeners so they notice the closed connection
+            self._event_received.set()
+
+    """Read line-framed messages from the socket and yield them decoded"""
+    async def read_messages(self):
+        while True:
+            try:
+                # Partial frames stay in the stream buffer until their separator arrives
+                message_bytes = await self._reader.readuntil(SOCKET_MESSAGE_SEPARATOR)
+            except asyncio.IncompleteReadError:
+                # Connection closed halfway through a message
+                return
+            except asyncio.LimitOverrunError as e:
+                _LOGGER.warning(f"Discarding message larger than { SOCKET_READ_LIMIT } bytes")
+                await self._reader.readexactly(e.consumed)
                 continue
-            elif read_bytes[-2:] != b"\r\n":
-                data += read_bytes
-                #_LOGGER.debug(f"Packet does not end with linefeed, waiting for more data")
+
+            message_bytes = message_bytes[:-len(SOCKET_MESSAGE_SEPARATOR)]
+            if len(message_bytes) == 0:
+                continue
+
+            try:
+                message = codec.decode(message_bytes)
+            except codec.DecodeError:
+                _LOGGER.warning("JSON Decode failed:")
+                _LOGGER.debug(f"Reply data: { message_bytes }")
+                continue
+
+            if message is not None:
+                yield message
+
+    """Dispatch a received message to its transaction or the event cache"""
+    def _dispatch_message(self, message):
+        try:
+            if OneSmartFieldName.TRANSACTION in message:
+                # Received message is a transaction response
+                self._resolve_transaction(message)
             else:
-                data += read_bytes
-                done_reading = True
-                
-        messages = data.split(b"\r\n")
-        
-        for message_bytes in messages:
-            if len(message_bytes) > 8:
-                reply = message_bytes.decode()
-                try:
-                    reply_data = json.loads(reply)
-                    if not reply_data == None:
-                        if OneSmartFieldName.TRANSACTION in reply_data:
-                            # Received message is a transaction response
-                            transaction_id = reply_data[OneSmartFieldName.TRANSACTION]
-                            self._response_cache[transaction_id] = reply_data
-                            
-                        else:
-                            # Message is not part of a transaction. Add to eventqueue.
-                            self._event_cache.append(reply_data)
-                except json.JSONDecodeError:
-                    _LOGGER.warning("JSON Decode failed:")
-                    _LOGGER.debug(f"Reply data: \"{ reply }\"")
-                except Exception as e:
-                    _LOGGER.error(f"Unexpected error while reading from the socket: { e }")
-
-
-    """Get the result of a cached transaction"""
-    def get_transaction(self, transaction_id):
-        if transaction_id in self._response_cache:
-            transaction = self._response_cache.pop(transaction_id)
-            return transaction
+                # Message is not part of a transaction. Add to eventqueue, superseded events are coalesced.
+                self._event_queue.put(message)
+                self._event_received.set()
+        except Exception as e:
+            _LOGGER.error(f"Unexpected error while reading from the socket: { e }")
+
+    def _resolve_transaction(self, reply_data):
+        transaction_id = reply_data[OneSmartFieldName.TRANSACTION]
+        transaction = self._transactions.get(transaction_id)
+        if transaction is not None and not transaction.done():
+            transaction.set_result(reply_data)
+        elif self._unclaimed.pop(transaction_id, None) is not None:
+            pass
+        elif self._abandoned.pop(transaction_id, None) is not None:
+            self.late_replies += 1
+            _LOGGER.debug(f"Received late response for transaction { transaction_id }")
         else:
-            return None
-    
-    """Return events and clear the cache"""
+            self.unknown_replies += 1
+            _LOGGER.debug(f"Received response for unknown transaction { transaction_id }")
+
+    """Give up on a transaction that passed its deadline"""
+    def _expire_transaction(self, transaction_id):
+        self._deadlines.pop(transaction_id, None)
+        transaction = self._transactions.get(transaction_id)
+        if transaction is not None and not transaction.done():
+            self.expired_transactions += 1
+            transaction.set_result(None)
+
+    def _release_transaction(self, transaction_id, transaction):
+        deadline = self._deadlines.pop(transaction_id, None)
+        if deadline is not None:
+            deadline.cancel()
+
+        if self._transactions.get(transaction_id) is transaction:
+            self._transactions.pop(transaction_id)
+            # Remember transactions that were given up on to recognize their late replies
+            if transaction.cancelled() or transaction.result() is None:
+                self._remember(self._abandoned, transaction_id)
+        self._in_flight.release()
+
+    """Remember a transaction id without a waiting caller, evicting the oldest when their replies are not coming anymore"""
+    def _remember(self, transaction_ids: dict, transaction_id):
+        now = monotonic()
+        transaction_ids[transaction_id] = now
+
+        for oldest_id, remembered_at in list(transaction_ids.items()):
+            if now - remembered_at < SOCKET_LATE_REPLY_WINDOW and len(transaction_ids) <= SOCKET_UNCLAIMED_MAX:
+                break
+            transaction_ids.pop(oldest_id)
+
+    """Resolve all outstanding transactions without a response"""
+    def _abort_transactions(self):
+        for deadline in self._deadlines.values():
+            deadline.cancel()
+        self._deadlines.clear()
+        for transaction in list(self._transactions.values()):
+            if not transaction.done():
+                transaction.set_result(None)
+        self._transactions.clear()
+
+    """Get the transaction counters of this connection"""
+    def get_metrics(self) -> dict:
+        return {
+            "in_flight": len(self._transactions),
+            "expired": self.expired_transactions,
+            "abandoned": len(self._abandoned),
+            "unclaimed": len(self._unclaimed),
+            "late_replies": self.late_replies,
+            "unknown_replies": self.unknown_replies,
+            "events": self._event_queue.get_metrics()
+        }
+
+    """Return events and clear the queue"""
     def get_events(self):
-        events = self._event_cache
-        self._event_cache = []
+        events = self._event_queue.get_all()
+        self._event_received.clear()
         return events
+
+    """Wait until events are received, then return them and clear the cache"""
+    async def wait_for_events(self):
+        if self.is_connected:
+            await self._event_received.wait()
+        return self.get_events()
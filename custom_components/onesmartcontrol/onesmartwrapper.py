@@ -1,9 +1,11 @@
 import asyncio
 import logging
 import struct
+from itertools import count
 from homeassistant.core import HomeAssistant, CoreState
+from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.dispatcher import async_dispatcher_send
-from homeassistant.util.timeout import TimeoutManager
+from homeassistant.helpers.storage import Store
 from socket import error as SOCKET_ERROR
 
 _LOGGER = logging.getLogger(__name__)
@@ -11,16 +13,8 @@ _LOGGER = logging.getLogger(__name__)
 from homeassistant.const import (
     EVENT_HOMEASSISTANT_STARTED,
     Platform, ATTR_UNIT_OF_MEASUREMENT, ATTR_DEVICE_CLASS, CONF_PLATFORM,
-    PERCENTAGE,
-    UnitOfTemperature,
-    UnitOfElectricPotential,
-    UnitOfElectricCurrent,
     UnitOfEnergy,
-    UnitOfFrequency,
-    UnitOfVolume,
-    UnitOfTime,
     UnitOfPower,
-    CONCENTRATION_PARTS_PER_MILLION,
     CONF_ATTRIBUTE,
     SERVICE_TURN_ON, SERVICE_TURN_OFF,
     CONF_DEVICE_ID, ATTR_NAME,
@@ -39,20 +33,41 @@ from homeassistant.components.select import (
     ATTR_OPTIONS, SERVICE_SELECT_OPTION
 )
 
-from time import time
+from time import time, monotonic
 
 from .const import *
-from .entitytemplates import ENTITY_TEMPLATES
+from .entitytemplates import match_entity_templates, match_sensor_attribute
+from .onesmartmodels import Device, Room, Preset, Meter, ApparatusAttribute
+from .onesmartpool import OneSmartSocketPool
+from .onesmartqueue import OneSmartCommandQueue
+from .onesmartreconnect import OneSmartReconnectBackoff
+from .onesmartscheduler import OneSmartPollScheduler, OneSmartBatchSizer
 from .onesmartsocket import OneSmartSocket
 
 class OneSmartWrapper():
-    def __init__(self, username, password, host, port, hass: HomeAssistant):
+    def __init__(self, username, password, host, port, hass: HomeAssistant, entry_id = None, poll_sockets = SOCKET_POLL_POOL_SIZE):
+        # One subscriber for pushed events and a pool of connections for requests
         self.sockets = {
-            SOCKET_PUSH: OneSmartSocket(),
-            SOCKET_POLL: OneSmartSocket()
+            SOCKET_PUSH: OneSmartSocket()
         }
+        for poll_socket in range(poll_sockets):
+            self.sockets[f"{ SOCKET_POLL }_{ poll_socket }"] = OneSmartSocket()
+
+        self.command_queues = {
+            socket_name: OneSmartCommandQueue(socket) for socket_name, socket in self.sockets.items()
+        }
+
+        self.socket_pool = OneSmartSocketPool()
+        for socket_name in self.sockets:
+            if socket_name != SOCKET_PUSH:
+                self.socket_pool.add(socket_name, self.sockets[socket_name], self.command_queues[socket_name])
+
+        self.reconnect_backoff = {socket_name: OneSmartReconnectBackoff() for socket_name in self.sockets}
+        self.reconnect_tasks = dict()
+        self.last_available = True
 
         self.runners = []
+        self.start_listener = None
 
         self.username = username
         self.password = password
@@ -60,7 +75,9 @@ class OneSmartWrapper():
         self.port = port
 
         self.hass = hass
+        self.entry_id = entry_id
         
+        # Definitions are stored as models, apparatus values and energy readings as plain values per attribute and meter
         self.cache = dict()
         self.cache[OneSmartEventType.ENERGY_CONSUMPTION] = dict()
         self.cache[(OneSmartCommand.METER,OneSmartAction.LIST)] = dict()
@@ -76,19 +93,37 @@ class OneSmartWrapper():
         self.last_update[INTERVAL_TRACKER_DEFINITIONS] = 0
 
         self.update_flags = []
-        self.command_queue = []
-
-        self.last_apparatus_index = dict()
+        self.update_event = asyncio.Event()
+        self.pending_sets = dict()
+        self.pending_flush = None
+        self.optimistic_values = dict()
+        # The latest set per attribute, a reply to an older set leaves the optimistic state to the newer one
+        self.set_generations = dict()
+        self.set_sequence = count()
+
+        self.poll_scheduler = OneSmartPollScheduler()
+        self.batch_sizer = OneSmartBatchSizer()
         self.device_apparatus_attributes = dict()
+        self.device_attribute_names = dict()
+        self.device_definitions = dict()
+        self.discovered_entities = dict()
+        self.discovery_errors = set()
+        self.rediscovery_pending = False
+        self.definitions_outdated = False
+        self.deadbands = dict()
+        self.discovery_store = None
+        self.discovery_cache_loaded = False
         self.entities = []
-
-        self.timeout = TimeoutManager()
     
     async def setup(self):
         for socket_name in self.sockets:
             connection_status = await self.connect(socket_name)
             if connection_status != OneSmartSetupStatus.SUCCESS:
                 return connection_status
+
+        connection_status = await self.initialize_poll()
+        if connection_status != OneSmartSetupStatus.SUCCESS:
+            return connection_status
         
         # Check cache
         cache = self.get_cache()
@@ -101,14 +136,19 @@ class OneSmartWrapper():
             return OneSmartSetupStatus.FAIL_CACHE
 
         async def setup_runners(_event):
+            self.start_listener = None
             self.runners.append(asyncio.create_task(
                 self.run_push()
             ))
             self.runners.append(asyncio.create_task(
                 self.run_poll()
             ))
+            for socket_name in self.sockets:
+                self.runners.append(asyncio.create_task(
+                    self.run_keepalive(socket_name)
+                ))
         if self.hass.state != CoreState.running:
-            self.hass.bus.async_listen_once(
+            self.start_listener = self.hass.bus.async_listen_once(
                 EVENT_HOMEASSISTANT_STARTED, setup_runners
             )
         else:
@@ -119,7 +159,7 @@ class OneSmartWrapper():
     async def connect(self, socket_name):
         socket = self.sockets[socket_name]
         try:
-            async with self.timeout.async_timeout(SOCKET_CONNECTION_TIMEOUT):
+            async with asyncio.timeout(SOCKET_CONNECTION_TIMEOUT):
                 connection_success = await socket.connect(self.host, self.port)
         except asyncio.TimeoutError:
             _LOGGER.warning(f"Connection timeout out after { SOCKET_CONNECTION_TIMEOUT } seconds")
@@ -137,8 +177,8 @@ class OneSmartWrapper():
 
         login_status = None
         try:
-            async with self.timeout.async_timeout(SOCKET_AUTHENTICATION_TIMEOUT):
-                login_status = await self.wait_for_transaction(socket_name, login_transaction)
+            async with asyncio.timeout(SOCKET_AUTHENTICATION_TIMEOUT):
+                login_status = await login_transaction
         except asyncio.TimeoutError:
             _LOGGER.warning(f"Authentication timeout out after { SOCKET_AUTHENTICATION_TIMEOUT } seconds")
             return OneSmartSetupStatus.FAIL_AUTH
@@ -149,72 +189,174 @@ class OneSmartWrapper():
             _LOGGER.info(f"Socket { socket_name }: Authentication successful")
         
 
-        if OneSmartFieldName.ERROR in login_status:
+        if login_status is None or OneSmartFieldName.ERROR in login_status:
             return OneSmartSetupStatus.FAIL_AUTH
         else:
             try:
                 if socket_name == SOCKET_PUSH:
                     # Subscribe to energy events
-                    await self.subscribe(topics=[OneSmartTopic.ENERGY, OneSmartTopic.SITE, OneSmartTopic.PRESET])
-                elif socket_name == SOCKET_POLL:
-                    # Set update flags
-                    self.set_update_flag((OneSmartCommand.SITE,OneSmartAction.GET))
-                    self.set_update_flag((OneSmartCommand.METER,OneSmartAction.LIST))
-                    self.set_update_flag((OneSmartCommand.DEVICE,OneSmartAction.LIST))
-                    self.set_update_flag((OneSmartCommand.PRESET,OneSmartAction.LIST))
-                    self.set_update_flag((OneSmartCommand.ROOM,OneSmartAction.LIST))
-                    self.last_update[INTERVAL_TRACKER_DEFINITIONS] = time()
-
-                    self.set_update_flag((OneSmartCommand.ENERGY,OneSmartAction.TOTAL))
-                    self.last_update[INTERVAL_TRACKER_POLL] = time()
-                    
-                    # Wait for incoming data
-                    await self.handle_update_flags()
-
-                    await self.discover_entities()
+                    await self.subscribe(topics=[OneSmartTopic.ENERGY, OneSmartTopic.SITE, OneSmartTopic.PRESET, OneSmartTopic.DEVICE, OneSmartTopic.ROOM, OneSmartTopic.METER, OneSmartTopic.APPARATUS])
+                else:
+                    self.socket_pool.reset(socket_name)
             except:
                 return OneSmartSetupStatus.FAIL_NETWORK
             else:
                 return OneSmartSetupStatus.SUCCESS
 
-    """Make sure the selected socket object is connected"""
+    """Refresh the caches over the poll connections and discover the entities"""
+    async def initialize_poll(self):
+        if len(self.discovered_entities) > 0:
+            # Resume the session with the known definitions, the next poll verifies them by the site version
+            self.set_update_flag((OneSmartCommand.SITE,OneSmartAction.GET))
+            return OneSmartSetupStatus.SUCCESS
+
+        try:
+            # Set update flags
+            self.set_update_flag((OneSmartCommand.SITE,OneSmartAction.GET))
+            self.set_update_flag((OneSmartCommand.METER,OneSmartAction.LIST))
+            self.set_update_flag((OneSmartCommand.DEVICE,OneSmartAction.LIST))
+            self.set_update_flag((OneSmartCommand.PRESET,OneSmartAction.LIST))
+            self.set_update_flag((OneSmartCommand.ROOM,OneSmartAction.LIST))
+            self.last_update[INTERVAL_TRACKER_DEFINITIONS] = time()
+
+            self.set_update_flag((OneSmartCommand.ENERGY,OneSmartAction.TOTAL))
+            self.last_update[INTERVAL_TRACKER_POLL] = time()
+            
+            # Wait for incoming data
+            await self.handle_update_flags()
+
+            # Discover entities from the stored device definitions when available
+            self.discovery_cache_loaded = await self.load_discovery_cache()
+            await self.discover_entities()
+            self.rediscovery_pending = False
+            if self.discovery_cache_loaded:
+                # Verify the stored definitions in the background, the poll runner replaces the entities whose description changed
+                self.definitions_outdated = True
+                self.rediscovery_pending = True
+            else:
+                await self.save_discovery_cache()
+        except:
+            return OneSmartSetupStatus.FAIL_NETWORK
+        else:
+            return OneSmartSetupStatus.SUCCESS
+
+    """Reconnect the selected socket until it succeeds, the keepalive closes sockets that stopped responding"""
     async def ensure_connected_socket(self, socket_name):
         socket = self.sockets[socket_name]
-        force_reconnect = False
-        for connect_attempt in range(0, SOCKET_RECONNECT_RETRIES):
-            try:
-                # Check if socket status is connected
-                if not socket.is_connected or force_reconnect:
-                    connection_status = await self.connect(socket_name)
-                    if not connection_status == OneSmartSetupStatus.SUCCESS:
-                        _LOGGER.warning(f"Reconnect failed. Trying again in {SOCKET_RECONNECT_DELAY} seconds. Attempt { connect_attempt + 1} of { SOCKET_RECONNECT_RETRIES }.")
-                        await asyncio.sleep(SOCKET_RECONNECT_DELAY)
-                    else:
-                        _LOGGER.info(f"Socket { socket_name } successfully reconnected after { connect_attempt + 1 } attempts.")
-                        force_reconnect = False
-                    continue
+        backoff = self.reconnect_backoff[socket_name]
 
-                # Try ping
-                ping_result = await self.command_wait(socket_name, OneSmartCommand.PING)
+        while not socket.is_connected and (self.hass.state == CoreState.not_running or self.hass.is_running):
+            backoff.disconnected()
+            self.update_availability()
 
-                if ping_result == None:
-                    _LOGGER.warning(f"Ping to server timed out. Reconnecting.")
-                    force_reconnect = True
-                    continue
+            delay = backoff.get_delay()
+            if delay > 0:
+                _LOGGER.info(f"Socket { socket_name }: Reconnecting in { delay:.1f } seconds, attempt { backoff.failures + 1 }.")
+                await asyncio.sleep(delay)
 
+            try:
+                connection_status = await self.connect(socket_name)
             except SOCKET_ERROR as e:
-                _LOGGER.warning(f"Connection error on socket {socket_name}: '{e}' Reconnecting in {SOCKET_RECONNECT_DELAY} seconds. Attempt { connect_attempt + 1 } of { SOCKET_RECONNECT_RETRIES }.")
-                force_reconnect = True
-                await asyncio.sleep(SOCKET_RECONNECT_DELAY)
-                
-                continue
+                _LOGGER.warning(f"Connection error on socket { socket_name }: { e }")
+                connection_status = OneSmartSetupStatus.FAIL_NETWORK
             except Exception as e:
-                _LOGGER.error(f"Unknown error while checking the connection: {e}")
+                _LOGGER.error(f"Unknown error while reconnecting socket { socket_name }: { e }")
+                connection_status = OneSmartSetupStatus.FAIL_NETWORK
+
+            if connection_status == OneSmartSetupStatus.SUCCESS:
+                _LOGGER.info(f"Socket { socket_name } successfully reconnected after { backoff.failures + 1 } attempts.")
+                backoff.succeeded()
+                self.update_availability()
+                if socket_name == SOCKET_PUSH:
+                    self.resume_polling()
             else:
-                # Connection successful
-                return
+                _LOGGER.warning(f"Socket { socket_name }: Reconnect failed ({ connection_status }), attempt { backoff.failures + 1 }.")
+                backoff.failed()
 
-        _LOGGER.error(f"Reconnect failed after { SOCKET_RECONNECT_RETRIES } attempts.")
+    """Poll everything soon, updates were missed while the subscription or the poll connections were down"""
+    def resume_polling(self):
+        self.poll_scheduler.expedite_all(time())
+        self.set_update_flag((OneSmartCommand.ENERGY,OneSmartAction.TOTAL))
+
+    """Entities are available unless reconnecting failed repeatedly for the push connection or every poll connection"""
+    @property
+    def available(self):
+        if self.reconnect_backoff[SOCKET_PUSH].state == OneSmartCircuitState.OPEN:
+            return False
+        return any(
+            self.reconnect_backoff[socket_name].state != OneSmartCircuitState.OPEN for socket_name in self.socket_pool.socket_names
+        )
+
+    """Let the entities update their availability when it changed"""
+    def update_availability(self):
+        available = self.available
+        if available == self.last_available:
+            return
+
+        self.last_available = available
+        if available:
+            _LOGGER.info(f"Connection to the gateway restored")
+        else:
+            _LOGGER.warning(f"Connection to the gateway lost, entities are unavailable until it is restored")
+        async_dispatcher_send(self.hass, OneSmartUpdateTopic.CONNECTION.target(self.entry_id))
+
+    """Make sure the poll connections are connected and healthy, refreshing the caches when the whole pool was down"""
+    async def ensure_connected_pool(self):
+        pool_available = self.socket_pool.is_available
+
+        # Reconnect connections whose requests keep failing
+        for socket_name in self.socket_pool.get_unhealthy():
+            socket = self.sockets[socket_name]
+            if socket.is_connected:
+                _LOGGER.warning(f"Socket { socket_name }: Requests keep failing. Reconnecting.")
+                await socket.close()
+
+        # Reconnect in the background while other connections serve the requests
+        for socket_name in self.socket_pool.socket_names:
+            reconnect_task = self.reconnect_tasks.get(socket_name)
+            if not self.sockets[socket_name].is_connected and (reconnect_task is None or reconnect_task.done()):
+                self.reconnect_tasks[socket_name] = asyncio.create_task(self.ensure_connected_socket(socket_name))
+
+        # Wait for the first connection when none is left
+        reconnect_tasks = [reconnect_task for reconnect_task in self.reconnect_tasks.values() if not reconnect_task.done()]
+        if not self.socket_pool.is_available and len(reconnect_tasks) > 0:
+            await asyncio.wait(reconnect_tasks, return_when=asyncio.FIRST_COMPLETED)
+
+        if not pool_available and self.socket_pool.is_available:
+            await self.initialize_poll()
+            # Nothing was polled while the pool was down
+            self.resume_polling()
+
+    """Keep a socket alive, pinging only when nothing was received for the ping interval"""
+    async def run_keepalive(self, socket_name) -> None:
+        socket = self.sockets[socket_name]
+
+        while self.hass.state == CoreState.not_running or self.hass.is_running:
+            # The runners reconnect closed sockets
+            if not socket.is_connected:
+                await asyncio.sleep(PING_INTERVAL)
+                continue
+
+            idle_time = socket.idle_time
+            if idle_time < PING_INTERVAL:
+                await asyncio.sleep(PING_INTERVAL - idle_time)
+                continue
+
+            try:
+                # Resolves to None when no reply arrives before the ping deadline
+                transaction = await self.command(socket_name, OneSmartCommand.PING, priority=OneSmartCommandPriority.INTERACTIVE)
+                ping_result = await transaction
+            except Exception as e:
+                _LOGGER.debug(f"Socket { socket_name }: Ping failed: { e }")
+                ping_result = None
+
+            # Other traffic arriving meanwhile also shows the connection is alive
+            if ping_result == None and socket.is_connected and socket.idle_time >= PING_INTERVAL:
+                _LOGGER.warning(f"Socket { socket_name }: Ping to server timed out. Reconnecting.")
+                try:
+                    await socket.close()
+                except:
+                    pass
 
     """Runner for the POLL channel"""
     async def run_poll(self) -> None:
@@ -223,15 +365,18 @@ class OneSmartWrapper():
 
         # Loop through received data, blocked by socket.read
         while self.hass.state == CoreState.not_running or self.hass.is_running:
-            await self.ensure_connected_socket(socket_name)
+            await self.ensure_connected_pool()
             try:
                 # Update caches
                 if time() > self.last_update[INTERVAL_TRACKER_DEFINITIONS] + SCAN_INTERVAL_DEFINITIONS:
                     _LOGGER.info(f"Updating definitions")
+                    _LOGGER.debug(f"Command queue metrics: { self.get_command_metrics() }")
+                    _LOGGER.debug(f"Poll connection metrics: { self.socket_pool.get_metrics() }")
+                    _LOGGER.debug(f"Transaction metrics: { self.get_transaction_metrics() }")
                     self.set_update_flag((OneSmartCommand.SITE,OneSmartAction.GET))
                     self.set_update_flag((OneSmartCommand.METER,OneSmartAction.LIST))
-                    # self.set_update_flag((OneSmartCommand.DEVICE,OneSmartAction.LIST))
-                    # self.set_update_flag((OneSmartCommand.ROOM,OneSmartAction.LIST))
+                    self.set_update_flag((OneSmartCommand.DEVICE,OneSmartAction.LIST))
+                    self.set_update_flag((OneSmartCommand.ROOM,OneSmartAction.LIST))
                     self.set_update_flag((OneSmartCommand.PRESET,OneSmartAction.LIST))
                     self.last_update[INTERVAL_TRACKER_DEFINITIONS] = time()
                     
@@ -244,9 +389,26 @@ class OneSmartWrapper():
                 
                 await self.handle_update_flags()
 
+                # Add and remove entities for changed definitions
+                if self.rediscovery_pending:
+                    await self.rediscover_entities()
+
                 # Update apparatus attributes
                 await self.poll_apparatus()
 
+                # Wait until the next attribute is due, or until an update is flagged
+                next_due = self.poll_scheduler.next_due()
+                if next_due == None:
+                    delay = SCAN_INTERVAL_APPARATUS_MAX
+                else:
+                    delay = min(max(next_due - time(), SCAN_INTERVAL_APPARATUS_MIN), SCAN_INTERVAL_APPARATUS_MAX)
+                try:
+                    async with asyncio.timeout(delay):
+                        await self.update_event.wait()
+                except asyncio.TimeoutError:
+                    pass
+                self.update_event.clear()
+
             except Exception as e:
                 _LOGGER.error(f"Error in { socket_name } gateway wrapper: { e }")
 
@@ -262,37 +424,62 @@ class OneSmartWrapper():
             socket = self.sockets[socket_name]
         
             try:
-                async with self.timeout.async_timeout(SOCKET_COMMAND_TIMEOUT):
-                    await socket.get_responses()
-                    
+                async with asyncio.timeout(SOCKET_COMMAND_TIMEOUT):
                     # Read events
-                    events = socket.get_events()
+                    events = await socket.wait_for_events()
                     
-                    # Handle events
+                    changed_meters = set()
+                    changed_devices = set()
+                    site_updated = False
+
+                    # Handle events, an event that fails does not keep the others from being applied and dispatched
                     for event in events:
-                        if event[OneSmartFieldName.EVENT] == OneSmartEventType.ENERGY_CONSUMPTION and len(self.cache[(OneSmartCommand.METER,OneSmartAction.LIST)]) > 0:
-                            # Set all meters to 0 in case no value is received
-                            for meter in self.cache[(OneSmartCommand.METER,OneSmartAction.LIST)]:
-                                self.cache[OneSmartEventType.ENERGY_CONSUMPTION][meter[OneSmartFieldName.ID]] = 0
-
-                            # Update meters from energy consumption event
-                            for reading in event[OneSmartFieldName.DATA][OneSmartFieldName.VALUES]:
-                                meter_value = reading["value"]
-                                self.cache[OneSmartEventType.ENERGY_CONSUMPTION][reading[OneSmartFieldName.ID]] = meter_value
-
-                        elif event[OneSmartFieldName.EVENT] == OneSmartEventType.SITE_UPDATE:
-                            self.cache[OneSmartEventType.SITE_UPDATE] = event[OneSmartFieldName.DATA]
-                        elif event[OneSmartFieldName.EVENT] == OneSmartEventType.PRESET_PERFORM:
-                            preset_id = event[OneSmartFieldName.DATA][OneSmartFieldName.ID]
-                            self.cache[(OneSmartCommand.PRESET,OneSmartAction.LIST)][preset_id][OneSmartFieldName.ACTIVE] = True
-                            self.set_update_flag((OneSmartCommand.PRESET,OneSmartAction.LIST))
-                            async_dispatcher_send(self.hass, OneSmartUpdateTopic.POLL)
-
-                    async_dispatcher_send(self.hass, OneSmartUpdateTopic.PUSH)
-
-                    # Send queued push commands
-                    for queued_command in self.command_queue:
-                        await self.command(socket_name, queued_command.pop("command"), kwargs = queued_command)
+                        try:
+                            if event[OneSmartFieldName.EVENT] == OneSmartEventType.ENERGY_CONSUMPTION and len(self.cache[(OneSmartCommand.METER,OneSmartAction.LIST)]) > 0:
+                                # Set all meters to 0 in case no value is received
+                                readings = {meter_id: 0 for meter_id in self.cache[(OneSmartCommand.METER,OneSmartAction.LIST)]}
+
+                                # Update meters from energy consumption event
+                                for reading_data in event[OneSmartFieldName.DATA][OneSmartFieldName.VALUES]:
+                                    readings[reading_data[OneSmartFieldName.ID]] = reading_data[OneSmartFieldName.VALUE]
+
+                                changed_meters.update(self.update_values(
+                                    self.cache[OneSmartEventType.ENERGY_CONSUMPTION], readings,
+                                    deadband=lambda meter_id: ENERGY_CONSUMPTION_DEADBAND
+                                ))
+
+                            elif event[OneSmartFieldName.EVENT] == OneSmartEventType.SITE_UPDATE:
+                                self.cache[OneSmartEventType.SITE_UPDATE] = event[OneSmartFieldName.DATA]
+                                site_updated = True
+                            elif event[OneSmartFieldName.EVENT] == OneSmartEventType.PRESET_PERFORM:
+                                preset_id = event[OneSmartFieldName.DATA][OneSmartFieldName.ID]
+                                self.cache[(OneSmartCommand.PRESET,OneSmartAction.LIST)][preset_id].active = True
+                                self.set_update_flag((OneSmartCommand.PRESET,OneSmartAction.LIST))
+                                async_dispatcher_send(self.hass, OneSmartUpdateTopic.POLL)
+                            elif event[OneSmartFieldName.EVENT] in [OneSmartEventType.DEVICE_DATA, OneSmartEventType.DEVICE_STATUS, OneSmartEventType.DEVICE_INPUT]:
+                                # Map pushed apparatus values into the cache polled values go to
+                                device_id = event[OneSmartFieldName.DATA].get(OneSmartFieldName.ID)
+                                values = self.get_event_attributes(device_id, event[OneSmartFieldName.DATA])
+                                if device_id == None or len(values) == 0:
+                                    continue
+
+                                values_cache = self.cache[(OneSmartCommand.APPARATUS,OneSmartAction.GET)].setdefault(device_id, {})
+                                values = self.without_optimistic_values(device_id, self.decode_apparatus_values(values))
+                                if len(self.update_values(values_cache, values, deadband=self.get_deadband)) > 0:
+                                    changed_devices.add(device_id)
+                                self.poll_scheduler.set_pushed(device_id, values, time())
+                            elif event[OneSmartFieldName.EVENT] in DISCOVERY_EVENTS:
+                                # Refresh the definitions, the poll runner rediscovers the entities
+                                for flag in DISCOVERY_EVENTS[event[OneSmartFieldName.EVENT]]:
+                                    self.set_update_flag(flag)
+                        except Exception as e:
+                            _LOGGER.error(f"Error while handling event { event.get(OneSmartFieldName.EVENT) } on { socket_name }: { e }")
+
+                    # Only notify the meters that changed, the site entities listen to the topic itself
+                    self.dispatch_targets(OneSmartUpdateTopic.PUSH, changed_meters)
+                    self.dispatch_targets(OneSmartUpdateTopic.APPARATUS, changed_devices)
+                    if site_updated:
+                        async_dispatcher_send(self.hass, OneSmartUpdateTopic.PUSH)
             except TimeoutError:
                 _LOGGER.debug(f"Timeout in { socket_name } while waiting for responses")
 
@@ -303,9 +490,24 @@ class OneSmartWrapper():
 
     """Shut down the wrapper"""
     async def close(self):
+        # Runners of a wrapper closed before Home Assistant started must not start later
+        if self.start_listener != None:
+            self.start_listener()
+            self.start_listener = None
+
         for task in self.runners:
             task.cancel()
 
+        if self.pending_flush != None:
+            self.pending_flush.cancel()
+            self.pending_flush = None
+
+        for task in self.reconnect_tasks.values():
+            task.cancel()
+
+        for command_queue in self.command_queues.values():
+            command_queue.close()
+
         for socket_name in self.sockets:
             try:
                 await self.sockets[socket_name].close()
@@ -313,41 +515,130 @@ class OneSmartWrapper():
                 pass
         
 
-    """Send command to the socket and return the transaction id"""
-    async def command(self, socket_name, command: OneSmartCommand, **kwargs) -> int:
-        socket = self.sockets[socket_name]
-        return await socket.send_cmd(command, **kwargs)
+    """Queue a command for the socket and return the transaction future once it is sent"""
+    async def command(self, socket_name, command: OneSmartCommand, priority = OneSmartCommandPriority.NORMAL, **kwargs) -> asyncio.Future:
+        # Requests for the poll channel are spread over the pool
+        if socket_name == SOCKET_POLL:
+            return await self.socket_pool.send_cmd(command, priority, **kwargs)
+        return await self.command_queues[socket_name].send_cmd(command, priority, **kwargs)
+
+    """Get the expired transactions and late replies per socket"""
+    def get_transaction_metrics(self) -> dict:
+        return {socket_name: socket.get_metrics() for socket_name, socket in self.sockets.items()}
+
+    """Get the queue metrics per socket and priority lane"""
+    def get_command_metrics(self) -> dict:
+        return {socket_name: command_queue.get_metrics() for socket_name, command_queue in self.command_queues.items()}
 
     """Send command to the socket and return the transaction data"""
     async def command_wait(self, socket_name, command: OneSmartCommand, **kwargs) -> dict:
-        transaction_id = await self.command(socket_name, command, **kwargs)
-
-        # Wait for transaction to return
+        transaction = await self.command(socket_name, command, **kwargs)
+        return await self.wait_for_transaction(socket_name, command, transaction)
+
+    """Wait for a sent command to return its transaction data, the socket resolves it to None after its deadline"""
+    async def wait_for_transaction(self, socket_name, command: OneSmartCommand, transaction: asyncio.Future) -> dict:
+        transaction_data = await transaction
+        if transaction_data == None:
+            _LOGGER.warning(f"Command on socket { socket_name } got no response in time: { command }")
+        return transaction_data
+
+
+    """Send commands back-to-back and return their transaction data in order"""
+    async def command_wait_all(self, socket_name, commands: list) -> list:
+        # The number of commands in flight is limited by the socket's pipeline window
+        return await asyncio.gather(*[
+            self.command_wait(socket_name, **command) for command in commands
+        ])
+
+    """Set apparatus attributes, showing the new values right away and sending only the latest value per attribute within the coalescing window"""
+    async def set_apparatus(self, device_id, attributes: dict):
+        values_cache = self.cache[(OneSmartCommand.APPARATUS,OneSmartAction.GET)].setdefault(device_id, {})
+        for attribute_name, value in attributes.items():
+            key = (device_id, attribute_name)
+            # Keep the last confirmed value to fall back to
+            if not key in self.optimistic_values:
+                self.optimistic_values[key] = values_cache.get(attribute_name)
+            values_cache[attribute_name] = value
+            self.pending_sets[key] = value
+            self.set_generations[key] = next(self.set_sequence)
+
+        self.dispatch_targets(OneSmartUpdateTopic.APPARATUS, [device_id])
+
+        if self.pending_flush == None:
+            self.pending_flush = asyncio.create_task(self.flush_apparatus_sets())
+
+    """Set apparatus attributes on several devices, sent together as one set per device"""
+    async def set_apparatus_many(self, device_attributes: dict):
+        for device_id, attributes in device_attributes.items():
+            await self.set_apparatus(device_id, attributes)
+
+    """Send the pending apparatus sets once the coalescing window has passed"""
+    async def flush_apparatus_sets(self):
+        await asyncio.sleep(COMMAND_COALESCE_WINDOW)
+        pending_sets = self.pending_sets
+        self.pending_sets = dict()
+        self.pending_flush = None
+
+        # Merge the sets per device, all devices go out back-to-back in one batch
+        device_sets = dict()
+        device_generations = dict()
+        for (device_id, attribute_name), value in pending_sets.items():
+            device_sets.setdefault(device_id, dict())[attribute_name] = value
+            device_generations.setdefault(device_id, dict())[attribute_name] = self.set_generations[(device_id, attribute_name)]
+
+        await asyncio.gather(*[
+            self.send_apparatus_set(device_id, attributes, device_generations[device_id])
+            for device_id, attributes in device_sets.items()
+        ])
+
+    """Send an apparatus set and confirm or revert the optimistic values"""
+    async def send_apparatus_set(self, device_id, attributes: dict, generations: dict):
         try:
-            async with self.timeout.async_timeout(SOCKET_COMMAND_TIMEOUT):
-                transaction = await self.wait_for_transaction(socket_name, transaction_id)
+            transaction = await self.command_wait(
+                SOCKET_PUSH, OneSmartCommand.APPARATUS, priority=OneSmartCommandPriority.INTERACTIVE,
+                action=OneSmartAction.SET, id=device_id, attributes=attributes
+            )
+        except Exception as e:
+            _LOGGER.warning(f"Could not set { attributes } for device { device_id }: { e }")
+            transaction = None
+
+        confirmed = transaction != None and self.get_error_code(transaction) == None
+        if transaction != None and not confirmed:
+            _LOGGER.warning(f"Could not set { attributes } for device { device_id }: Server responded with { self.get_error_code(transaction) }")
+
+        values_cache = self.cache[(OneSmartCommand.APPARATUS,OneSmartAction.GET)].setdefault(device_id, {})
+        reverted = False
+        unknown_attributes = []
+        for attribute_name, value in attributes.items():
+            key = (device_id, attribute_name)
+            # A newer value is pending or in flight, it keeps the optimistic state
+            if self.set_generations.get(key) != generations[attribute_name]:
+                continue
 
-        except asyncio.TimeoutError:
-            _LOGGER.warning(f"Command on socket { socket_name } timed out after {SOCKET_COMMAND_TIMEOUT} seconds: { command }")
-            return None
-        else:
-            return transaction
-
-    async def wait_for_transaction(self, socket_name, transaction_id):
-        transaction_done = False
-        first_loop = True
-        while not transaction_done:
-            if first_loop:
-                first_loop = False
-            else:
-                # Wait for a bit if the first loop did not retrieve a result
-                await asyncio.sleep(1)
-            await self.sockets[socket_name].get_responses()
-            transaction = self.sockets[socket_name].get_transaction(transaction_id)
-            transaction_done = transaction != None
-            
-        return transaction
-        
+            self.set_generations.pop(key)
+            previous_value = self.optimistic_values.pop(key, None)
+            if not confirmed and values_cache.get(attribute_name) == value:
+                if previous_value == None:
+                    # Nothing to fall back to, poll the actual value right away
+                    values_cache.pop(attribute_name, None)
+                    unknown_attributes.append(attribute_name)
+                else:
+                    values_cache[attribute_name] = previous_value
+                reverted = True
+
+        if reverted:
+            self.dispatch_targets(OneSmartUpdateTopic.APPARATUS, [device_id])
+
+        # Verify the gateway state with a poll shortly after
+        self.poll_scheduler.expedite(device_id, attributes, time() + COMMAND_CONFIRM_DELAY)
+        self.poll_scheduler.expedite(device_id, unknown_attributes, time())
+        self.update_event.set()
+
+    """Drop received values of attributes that are being set, they would undo the optimistic state"""
+    def without_optimistic_values(self, device_id, values: dict) -> dict:
+        if len(self.optimistic_values) == 0:
+            return values
+        return {name: value for name, value in values.items() if not (device_id, name) in self.optimistic_values}
 
     """Subscribe the socket to the specified event topics"""
     async def subscribe(self, topics: list):
@@ -356,77 +647,119 @@ class OneSmartWrapper():
 
     def set_update_flag(self, flag):
         self.update_flags.append(flag)
+        self.update_event.set()
     
     async def handle_update_flags(self):
         dispatcher_topics = []
 
+        update_flags = self.update_flags
+        self.update_flags = []
+
         # Handle update flags
-        if len(self.update_flags) > 0:
-            _LOGGER.info(f"Handling { len(self.update_flags) } update flags: { self.update_flags }")
-        for flag in self.update_flags:
+        if len(update_flags) > 0:
+            _LOGGER.info(f"Handling { len(update_flags) } update flags: { update_flags }")
+
+        # Request all definitions in one pipelined batch
+        request_flags = []
+        for flag in update_flags:
+            if flag[0] in [OneSmartCommand.SITE, OneSmartCommand.METER, OneSmartCommand.DEVICE, OneSmartCommand.ENERGY, OneSmartCommand.ROOM, OneSmartCommand.PRESET]:
+                if not flag in request_flags:
+                    request_flags.append(flag)
+
+        # Energy totals are refreshed in the background, definitions ahead of apparatus polls
+        transactions = await self.command_wait_all(SOCKET_POLL, [
+            {
+                "command":flag[0], OneSmartFieldName.ACTION:flag[1],
+                "priority":OneSmartCommandPriority.BACKGROUND if flag[0] == OneSmartCommand.ENERGY else OneSmartCommandPriority.NORMAL
+            } for flag in request_flags
+        ])
+
+        for flag, transaction in zip(request_flags, transactions):
             try:
                 flag_command = flag[0]
-                flag_action = flag[1]
 
-                if flag_command in [OneSmartCommand.SITE, OneSmartCommand.METER, OneSmartCommand.DEVICE, OneSmartCommand.ENERGY, OneSmartCommand.ROOM, OneSmartCommand.PRESET]:
-                    transaction = await self.command_wait(SOCKET_POLL, command=flag_command, action=flag_action)
-                    if transaction == None:
-                        # Skip if transaction returns no data.
-                        continue
-                    elif not OneSmartFieldName.RESULT in transaction:
-                        # TODO: Set depending sensors to unavailable
-                        continue
-                    else:
-                        transaction_result = transaction[OneSmartFieldName.RESULT]
+                if transaction == None:
+                    # Skip if transaction returns no data.
+                    continue
+                elif not OneSmartFieldName.RESULT in transaction:
+                    # TODO: Set depending sensors to unavailable
+                    continue
+                else:
+                    transaction_result = transaction[OneSmartFieldName.RESULT]
+
+                if flag_command == OneSmartCommand.SITE:
+                    previous_version = self.cache[flag].get(OneSmartFieldName.VERSION)
+
+                    # Fill cache with RPC result
+                    self.cache[flag] = transaction_result
+
+                    # Definitions may have changed with the gateway version, e.g. while the connection was down
+                    if previous_version != None and previous_version != transaction_result.get(OneSmartFieldName.VERSION):
+                        _LOGGER.info(f"Gateway version changed from { previous_version } to { transaction_result.get(OneSmartFieldName.VERSION) }, refreshing definitions")
+                        self.set_update_flag((OneSmartCommand.METER,OneSmartAction.LIST))
+                        self.set_update_flag((OneSmartCommand.DEVICE,OneSmartAction.LIST))
+                        self.set_update_flag((OneSmartCommand.ROOM,OneSmartAction.LIST))
+                        self.set_update_flag((OneSmartCommand.PRESET,OneSmartAction.LIST))
+                        # Refetched by the rediscovery that follows the refreshed device list
+                        self.definitions_outdated = True
+
+                    # Also store in Site Event cache
+                    self.cache[OneSmartEventType.SITE_UPDATE] = transaction_result
+
+                    if not OneSmartUpdateTopic.DEFINITIONS in dispatcher_topics:
+                        dispatcher_topics.append(OneSmartUpdateTopic.DEFINITIONS)
+                    # The site entities listen to the push topic, a polled site may hold a pushed update that was missed
+                    if not OneSmartUpdateTopic.PUSH in dispatcher_topics:
+                        dispatcher_topics.append(OneSmartUpdateTopic.PUSH)
+
+                elif flag_command == OneSmartCommand.METER:
+                    # Fill cache with RPC result (in corresponding subkey)
+                    if OneSmartFieldName.METERS in transaction_result:
+                        meters = [Meter.from_dict(entry) for entry in transaction_result[OneSmartFieldName.METERS]]
+                        self.cache[flag] = {meter.id: meter for meter in meters}
+                        self.rediscovery_pending = True
+
+                        if not OneSmartUpdateTopic.DEFINITIONS in dispatcher_topics:
+                            dispatcher_topics.append(OneSmartUpdateTopic.DEFINITIONS)
 
-                    if flag_command == OneSmartCommand.SITE:
-                        # Fill cache with RPC result
-                        self.cache[flag] = transaction_result
+                elif flag_command == OneSmartCommand.ENERGY:
+                    if OneSmartFieldName.VALUES in transaction_result:
+                        totals = {entry[OneSmartFieldName.ID]: entry[OneSmartFieldName.VALUE] for entry in transaction_result[OneSmartFieldName.VALUES]}
+                        changed_meters = self.update_values(self.cache[flag], totals)
+                        self.dispatch_targets(OneSmartUpdateTopic.POLL, changed_meters)
+                elif flag_command == OneSmartCommand.DEVICE:
+                    if OneSmartFieldName.DEVICES in transaction_result:
+                        devices = [Device.from_dict(entry) for entry in transaction_result[OneSmartFieldName.DEVICES]]
+                        self.cache[flag] = {device.id: device for device in devices}
+                        self.rediscovery_pending = True
 
-                        # Also store in Site Event cache
-                        self.cache[OneSmartEventType.SITE_UPDATE] = transaction_result
+                        if not OneSmartUpdateTopic.DEFINITIONS in dispatcher_topics:
+                            dispatcher_topics.append(OneSmartUpdateTopic.DEFINITIONS)
+                elif flag_command == OneSmartCommand.PRESET:
+                    if OneSmartFieldName.PRESETS in transaction_result:
+                        presets = [Preset.from_dict(entry) for entry in transaction_result[OneSmartFieldName.PRESETS]]
+                        self.cache[flag] = {preset.id: preset for preset in presets}
+                        self.rediscovery_pending = True
+
+                        if not OneSmartUpdateTopic.POLL in dispatcher_topics:
+                            dispatcher_topics.append(OneSmartUpdateTopic.POLL)
+                elif flag_command == OneSmartCommand.ROOM:
+                    if OneSmartFieldName.ROOMS in transaction_result:
+                        rooms = [Room.from_dict(entry) for entry in transaction_result[OneSmartFieldName.ROOMS]]
+                        self.cache[flag] = {room.id: room for room in rooms}
+                        self.rediscovery_pending = True
 
                         if not OneSmartUpdateTopic.DEFINITIONS in dispatcher_topics:
                             dispatcher_topics.append(OneSmartUpdateTopic.DEFINITIONS)
+            except Exception as e:
+                _LOGGER.error(f"Error while handling update flag { flag }: { e }")
+
+        for flag in update_flags:
+            try:
+                flag_command = flag[0]
+                flag_action = flag[1]
 
-                    elif flag_command == OneSmartCommand.METER:
-                        # Fill cache with RPC result (in corresponding subkey)
-                        if OneSmartFieldName.METERS in transaction_result:
-                            self.cache[flag] = transaction_result[OneSmartFieldName.METERS]
-
-                            if not OneSmartUpdateTopic.DEFINITIONS in dispatcher_topics:
-                                dispatcher_topics.append(OneSmartUpdateTopic.DEFINITIONS)
-
-                    elif flag_command == OneSmartCommand.ENERGY:
-                        if OneSmartFieldName.VALUES in transaction_result:
-                            for entry in transaction_result[OneSmartFieldName.VALUES]:
-                                self.cache[flag][entry[OneSmartFieldName.ID]] = entry[OneSmartFieldName.VALUE]
-
-                            if not OneSmartUpdateTopic.POLL in dispatcher_topics:
-                                dispatcher_topics.append(OneSmartUpdateTopic.POLL)
-                    elif flag_command == OneSmartCommand.DEVICE:
-                        if OneSmartFieldName.DEVICES in transaction_result:
-                            for entry in transaction_result[OneSmartFieldName.DEVICES]:
-                                self.cache[flag][entry[OneSmartFieldName.ID]] = entry
-                            
-                            if not OneSmartUpdateTopic.DEFINITIONS in dispatcher_topics:
-                                dispatcher_topics.append(OneSmartUpdateTopic.DEFINITIONS)
-                    elif flag_command == OneSmartCommand.PRESET:
-                        if OneSmartFieldName.PRESETS in transaction_result:
-                            for entry in transaction_result[OneSmartFieldName.PRESETS]:
-                                self.cache[flag][entry[OneSmartFieldName.ID]] = entry
-
-                            if not OneSmartUpdateTopic.POLL in dispatcher_topics:
-                                dispatcher_topics.append(OneSmartUpdateTopic.POLL)
-                    elif flag_command == OneSmartCommand.ROOM:
-                        if OneSmartFieldName.ROOMS in transaction_result:
-                            for entry in transaction_result[OneSmartFieldName.ROOMS]:
-                                self.cache[flag][entry[OneSmartFieldName.ID]] = entry
-
-                            if not OneSmartUpdateTopic.DEFINITIONS in dispatcher_topics:
-                                dispatcher_topics.append(OneSmartUpdateTopic.DEFINITIONS)
-
-                elif flag_command == OneSmartCommand.APPARATUS:
+                if flag_command == OneSmartCommand.APPARATUS:
                     if flag_action == OneSmartAction.LIST:
                         for device_id in self.cache[(OneSmartCommand.DEVICE, OneSmartAction.LIST)]:
                             transaction = await self.command_wait(
@@ -445,73 +778,149 @@ class OneSmartWrapper():
             except Exception as e:
                 _LOGGER.error(f"Error while handling update flag { flag }: { e }")
 
-        self.update_flags = []        
-        
         # Send dispatcher event to update bound entities
         for topic in dispatcher_topics:
             async_dispatcher_send(self.hass, topic)
         
     async def poll_apparatus(self):
-        # Update apparatus values
-        for device_id in self.device_apparatus_attributes:
-            devices = self.cache[(OneSmartCommand.DEVICE,OneSmartAction.LIST)]
-            device = devices[device_id]
-            device_name = device[OneSmartFieldName.NAME]
+        devices = self.cache[(OneSmartCommand.DEVICE,OneSmartAction.LIST)]
 
-            attributes = self.device_apparatus_attributes[device_id]
-            attribute_names = [attribute_name for attribute_name in attributes]
+        # Select the apparatus attributes that are due for each device
+        poll_requests = self.poll_scheduler.get_due(
+            time(), lambda device_id: self.batch_sizer.get_size(devices[device_id].type)
+        )
+        if len(poll_requests) == 0:
+            return
 
-            if(len(attributes) == 0):
-                continue
+        async def poll_device(device_id, split_attributes):
+            transaction = await self.command(
+                SOCKET_POLL,
+                command=OneSmartCommand.APPARATUS, priority=OneSmartCommandPriority.BACKGROUND,
+                action=OneSmartAction.GET, id=device_id, attributes=split_attributes
+            )
+            # Time the response from the moment the request left the pipeline window
+            start = monotonic()
+            transaction = await self.wait_for_transaction(SOCKET_POLL, OneSmartCommand.APPARATUS, transaction)
+            return transaction, monotonic() - start
 
-            # Only poll MAX_APPARATUS_POLL per cycle
-            if not device_id in self.last_apparatus_index:
-                attribute_index = 0
-            else:
-                attribute_index = self.last_apparatus_index[device_id]
-                if attribute_index >= len(attribute_names):
-                    attribute_index = 0
-            
-            end_index = attribute_index + MAX_APPARATUS_POLL
-            if end_index > len(attribute_names):
-                split_attributes = attribute_names[attribute_index:]
-            else:
-                split_attributes = attribute_names[attribute_index:end_index]
+        # Update apparatus values
+        results = await asyncio.gather(*[
+            poll_device(device_id, split_attributes) for device_id, split_attributes in poll_requests
+        ])
 
-            self.last_apparatus_index[device_id] = end_index
+        changed_devices = []
+        for (device_id, split_attributes), (transaction, response_time) in zip(poll_requests, results):
+            device_name = devices[device_id].name
+            device_type = devices[device_id].type
+
+            # Attributes that were not received are requested again soon instead of after their interval
+            retry_due = time() + APPARATUS_POLL_RETRY_DELAY
 
-            await self.ensure_connected_socket(SOCKET_POLL)
-            transaction = await self.command_wait(
-                SOCKET_POLL,
-                command=OneSmartCommand.APPARATUS, action=OneSmartAction.GET, 
-                id=device_id, attributes=split_attributes
-            )
             if transaction == None:
                 _LOGGER.warning(f"Could not update {split_attributes} for '{device_name}': Client read timed out")
+                self.batch_sizer.observe(device_type, len(split_attributes), None)
+                self.poll_scheduler.expedite(device_id, split_attributes, retry_due)
                 continue
-            if OneSmartFieldName.ERROR in transaction[OneSmartFieldName.RESULT]:
+
+            error_code = self.get_error_code(transaction)
+            self.batch_sizer.observe(device_type, len(split_attributes), response_time, error_code)
+            if error_code != None:
                 _LOGGER.warning(f"Could not update {split_attributes} for '{device_name}': Server responded with {transaction[OneSmartFieldName.RESULT]}")
+                self.poll_scheduler.expedite(device_id, split_attributes, retry_due)
             else:
                 try:
-                    values_new = transaction[OneSmartFieldName.RESULT][OneSmartFieldName.ATTRIBUTES]
-                    for value_name in values_new:
-                        value = values_new[value_name]
-                        if isinstance(value, int):
-                            bit_length = value.bit_length()
-                            if bit_length >= BIT_LENGTH_DOUBLE - 4:
-                                values_new[value_name] = struct.unpack("<d",value.to_bytes(8,byteorder="little", signed=True))[0]
-                                if values_new[value_name] < 1:
-                                    values_new[value_name] = 0
-
-                    if device_id in self.cache[(OneSmartCommand.APPARATUS,OneSmartAction.GET)]:
-                        values_cache = self.cache[(OneSmartCommand.APPARATUS,OneSmartAction.GET)][device_id]
-                    else:
-                        values_cache = {}
-                    self.cache[(OneSmartCommand.APPARATUS,OneSmartAction.GET)][device_id] = values_cache | values_new
+                    values_received = self.decode_apparatus_values(transaction[OneSmartFieldName.RESULT][OneSmartFieldName.ATTRIBUTES])
+                    values_new = self.without_optimistic_values(device_id, values_received)
+                    values_cache = self.cache[(OneSmartCommand.APPARATUS,OneSmartAction.GET)].setdefault(device_id, {})
+                    changed_attributes = self.update_values(values_cache, values_new, deadband=self.get_deadband)
+                    if len(changed_attributes) > 0:
+                        changed_devices.append(device_id)
+
+                    # Learn how volatile each attribute is, values being set say nothing about that
+                    for attribute_name in split_attributes:
+                        if attribute_name in values_new:
+                            self.poll_scheduler.observe(device_id, attribute_name, attribute_name in changed_attributes)
+                    self.poll_scheduler.expedite(device_id, [
+                        attribute_name for attribute_name in split_attributes if not attribute_name in values_received
+                    ], retry_due)
                 except Exception as e:
                     _LOGGER.warning(f"Could not update {split_attributes} for '{device_name}': { e } ''")
+                    self.poll_scheduler.expedite(device_id, split_attributes, retry_due)
             
-        async_dispatcher_send(self.hass, OneSmartUpdateTopic.APPARATUS)
+        self.dispatch_targets(OneSmartUpdateTopic.APPARATUS, changed_devices)
+
+    """Convert apparatus values that are sent as the bits of a double"""
+    def decode_apparatus_values(self, values: dict) -> dict:
+        for value_name in values:
+            value = values[value_name]
+            if isinstance(value, int):
+                bit_length = value.bit_length()
+                if bit_length >= BIT_LENGTH_DOUBLE - 4:
+                    values[value_name] = struct.unpack("<d",value.to_bytes(8,byteorder="little", signed=True))[0]
+                    if values[value_name] < 1:
+                        values[value_name] = 0
+        return values
+
+    """Get the values of a device event, from its attributes object or the event data itself, that are attributes in the device's definition"""
+    def get_event_attributes(self, device_id, data: dict) -> dict:
+        attribute_names = self.device_attribute_names.get(device_id, frozenset())
+        attributes = data.get(OneSmartFieldName.ATTRIBUTES)
+        if not isinstance(attributes, dict):
+            attributes = data
+        return {key: value for key, value in attributes.items() if key in attribute_names}
+
+    """Get the error code from a transaction, or None if it succeeded"""
+    def get_error_code(self, transaction: dict):
+        result = transaction.get(OneSmartFieldName.RESULT)
+        if not isinstance(result, dict) or not OneSmartFieldName.ERROR in result:
+            return None
+
+        error = result[OneSmartFieldName.ERROR]
+        if isinstance(error, dict):
+            return error.get(OneSmartFieldName.CODE, error)
+        else:
+            return error
+
+    """Write values into a cache and return the keys whose value changed"""
+    def update_values(self, cache: dict, values: dict, deadband = None) -> list:
+        changed = []
+        for key, value in values.items():
+            if key in cache:
+                key_deadband = deadband(key) if deadband != None else None
+                if not self.is_significant_change(cache[key], value, key_deadband):
+                    continue
+            cache[key] = value
+            changed.append(key)
+        return changed
+
+    """Check if a new value differs enough from the cached value to publish it"""
+    def is_significant_change(self, old_value, new_value, deadband = None) -> bool:
+        if old_value == new_value:
+            return False
+        elif deadband == None:
+            return True
+        elif isinstance(old_value, bool) or not isinstance(old_value, (int, float)):
+            return True
+        elif isinstance(new_value, bool) or not isinstance(new_value, (int, float)):
+            return True
+
+        absolute, relative = deadband
+        return abs(new_value - old_value) > max(absolute, relative * abs(old_value))
+
+    """Look up the deadband of an apparatus attribute"""
+    def get_deadband(self, attribute_name):
+        if not attribute_name in self.deadbands:
+            self.deadbands[attribute_name] = None
+            for name_part, deadband in VALUE_DEADBANDS.items():
+                if name_part in attribute_name:
+                    self.deadbands[attribute_name] = deadband
+                    break
+        return self.deadbands[attribute_name]
+
+    """Notify the entities of the changed devices or meters"""
+    def dispatch_targets(self, topic: OneSmartUpdateTopic, targets):
+        for target in targets:
+            async_dispatcher_send(self.hass, topic.target(target))
 
     def get_cache(self, cache_name = None):
         if cache_name == None:
@@ -519,270 +928,454 @@ class OneSmartWrapper():
         else:
             return self.cache[cache_name]
 
+    """Discover the entities of all devices, rooms and meters"""
     async def discover_entities(self):
-        
-        self.entities = dict()
+        devices = self.cache[(OneSmartCommand.DEVICE,OneSmartAction.LIST)]
+        _LOGGER.info(f"Discovering entities for {len(devices)} devices")
+
+        # Fetch the definitions of unknown devices in parallel
+        self.device_definitions |= await self.fetch_device_definitions([
+            device for device_id, device in devices.items()
+            if device.visible != False and not device_id in self.device_definitions
+        ])
+
+        self.discovered_entities = self.discover_targets()
+        self.update_platform_entities()
+
         for platform_name in Platform:
-            self.entities[platform_name] = list()
+            platform_entities = self.entities[platform_name]
+            if(len(platform_entities) > 0):
+                _LOGGER.info(f"Discovered { len(platform_entities) } entities for platform { platform_name }")
 
+    """Add, remove and replace the entities of devices, rooms and meters that changed since the last discovery"""
+    async def rediscover_entities(self):
+        self.rediscovery_pending = False
+        refresh_definitions = self.definitions_outdated
+        self.definitions_outdated = False
         devices = self.cache[(OneSmartCommand.DEVICE,OneSmartAction.LIST)]
-        _LOGGER.info(f"Discovering entities for {len(devices)} devices")
 
-        # Discover device attributes
-        for device_id in devices:
+        # Only new devices need their definition fetched, unless the known definitions may be outdated
+        fetched_definitions = await self.fetch_device_definitions([
+            device for device_id, device in devices.items()
+            if device.visible != False and (refresh_definitions or not device_id in self.device_definitions)
+        ])
+        new_definitions = {
+            device_id: definition for device_id, definition in fetched_definitions.items()
+            if self.device_definitions.get(device_id) != definition
+        }
+        previous_definitions = {device_id: self.device_definitions.get(device_id) for device_id in new_definitions}
+        self.device_definitions |= new_definitions
+        if refresh_definitions and len(new_definitions) > 0:
+            _LOGGER.info(f"Definitions of { len(new_definitions) } devices changed")
+
+        discovered_entities = self.discover_targets()
+
+        # Keep the definitions the live entities were built from when a changed one could not be applied, the next refresh retries it
+        for device_id in self.discovery_errors & new_definitions.keys():
+            new_definitions.pop(device_id)
+            if previous_definitions[device_id] == None:
+                self.device_definitions.pop(device_id)
+            else:
+                self.device_definitions[device_id] = previous_definitions[device_id]
+                self.definitions_outdated = True
+
+        added_entities = []
+        removed_entities = []
+        replaced_entities = []
+        for target in self.discovered_entities.keys() | discovered_entities.keys():
+            old_entities = {self.get_entity_identity(entity): entity for entity in self.discovered_entities.get(target, [])}
+            new_entities = {self.get_entity_identity(entity): entity for entity in discovered_entities.get(target, [])}
+            added_entities += [entity for identity, entity in new_entities.items() if not identity in old_entities]
+            removed_entities += [entity for identity, entity in old_entities.items() if not identity in new_entities]
+            # The same entity with a changed description, e.g. the color modes of a light or the options of a preset select
+            replaced_entities += [entity for identity, entity in new_entities.items() if identity in old_entities and entity != old_entities[identity]]
+
+        removed_devices = [
+            target_id for target_type, target_id in self.discovered_entities.keys() - discovered_entities.keys()
+            if target_type == OneSmartCommand.DEVICE
+        ]
+        for device_id in removed_devices:
+            self.poll_scheduler.remove_device(device_id)
+            self.device_apparatus_attributes.pop(device_id, None)
+            self.device_attribute_names.pop(device_id, None)
+            self.device_definitions.pop(device_id, None)
+
+        self.discovered_entities = discovered_entities
+        self.update_platform_entities()
+
+        # Store the changed definitions, and the current site version after refreshing them
+        if refresh_definitions or len(new_definitions) > 0 or len(removed_devices) > 0:
+            await self.save_discovery_cache()
+
+        if len(added_entities) == 0 and len(removed_entities) == 0 and len(replaced_entities) == 0:
+            return
+        _LOGGER.info(f"Rediscovery added { len(added_entities) }, removed { len(removed_entities) } and replaced { len(replaced_entities) } entities")
+
+        for platform_name in Platform:
+            platform_removed = [entity for entity in removed_entities if entity[CONF_PLATFORM] == platform_name]
+            platform_added = [entity for entity in added_entities if entity[CONF_PLATFORM] == platform_name]
+            platform_replaced = [entity for entity in replaced_entities if entity[CONF_PLATFORM] == platform_name]
+            if len(platform_removed) > 0:
+                async_dispatcher_send(self.hass, OneSmartUpdateTopic.REMOVE.target(platform_name), platform_removed)
+            if len(platform_added) > 0:
+                async_dispatcher_send(self.hass, OneSmartUpdateTopic.DISCOVERY.target(platform_name), platform_added)
+            if len(platform_replaced) > 0:
+                async_dispatcher_send(self.hass, OneSmartUpdateTopic.REPLACE.target(platform_name), platform_replaced)
+
+        # Entities of removed devices are gone, remove the devices themselves as well
+        device_registry = dr.async_get(self.hass)
+        for device_id in removed_devices:
+            device_entry = device_registry.async_get_device(identifiers={(DOMAIN, device_id)})
+            if device_entry != None:
+                device_registry.async_remove_device(device_entry.id)
+
+    """Describe the entities of every visible device, room and meter, by discovery target"""
+    def discover_targets(self) -> dict:
+        targets = dict()
+        self.discovery_errors = set()
+
+        devices = self.cache[(OneSmartCommand.DEVICE,OneSmartAction.LIST)]
+        for device_id, device in devices.items():
+            if device.visible == False or not device_id in self.device_definitions:
+                continue
+            target = (OneSmartCommand.DEVICE, device_id)
             try:
-                device = devices[device_id]
-                device_name = device[OneSmartFieldName.NAME]
-                if(device[OneSmartFieldName.VISIBLE] == False):
-                    continue
+                targets[target] = self.discover_device_entities(device, self.device_definitions[device_id])
+            except Exception as e:
+                _LOGGER.error(f"Error while discovering entities for device { device.name }: { e }")
+                targets[target] = self.discovered_entities.get(target, [])
+                self.discovery_errors.add(device_id)
 
-                transaction = await self.command_wait(SOCKET_POLL, OneSmartCommand.APPARATUS, action=OneSmartAction.LIST, id=device_id)
-                attributes = transaction[OneSmartFieldName.RESULT][OneSmartFieldName.ATTRIBUTES]
-                self.device_apparatus_attributes[device_id] = dict()
-                
-                device_attribute_names = [attribute[OneSmartFieldName.NAME] for attribute in attributes]
-
-                for platform_name in ENTITY_TEMPLATES:
-                    for entity_template in ENTITY_TEMPLATES[platform_name]:
-                        entity_template_keys = [value for value in list(entity_template.values()) if isinstance(value, str)]
-                        if all(attribute_name in device_attribute_names for attribute_name in entity_template_keys):
-                            entity = dict()
-                            entity[CONF_PLATFORM] = platform_name
-                            entity[ONESMART_CACHE] = (OneSmartCommand.APPARATUS,OneSmartAction.GET)
-                            entity[ATTR_NAME] = None
-                            entity[CONF_DEVICE_ID] = device_id
-                            entity[OneSmartUpdateTopic] = OneSmartUpdateTopic.APPARATUS
-                            entity = entity | entity_template
-
-                            for entity_template_key in entity_template:
-                                key = entity_template[entity_template_key]
-                                if isinstance(key, str):
-                                    entity[entity_template_key] = f"{device_id}.{key}"
-
-                            # Append the entity
-                            self.entities[entity[CONF_PLATFORM]].append(entity)
-
-                            # Mark the attribute for polling
-                            for attribute_name in entity_template_keys:
-                                self.device_apparatus_attributes[device_id][attribute_name] = attribute_name
-                        
-                    
+        rooms = self.cache[(OneSmartCommand.ROOM,OneSmartAction.LIST)]
+        for room_id, room in rooms.items():
+            if room.visible == False:
+                continue
+            target = (OneSmartCommand.ROOM, room_id)
+            try:
+                targets[target] = self.discover_room_entities(room)
+            except Exception as e:
+                _LOGGER.error(f"Error while discovering entities for room { room.name }: { e }")
+                targets[target] = self.discovered_entities.get(target, [])
+
+        meters = self.cache[(OneSmartCommand.METER,OneSmartAction.LIST)]
+        for meter_id, meter in meters.items():
+            targets[(OneSmartCommand.METER, meter_id)] = self.discover_meter_entities(meter)
+
+        return targets
+
+    """Group the discovered entities by platform"""
+    def update_platform_entities(self):
+        self.entities = dict()
+        for platform_name in Platform:
+            self.entities[platform_name] = list()
+
+        for target_entities in self.discovered_entities.values():
+            for entity in target_entities:
+                self.entities[entity[CONF_PLATFORM]].append(entity)
+
+    """Identify an entity description by its platform and the cache keys it reads"""
+    def get_entity_identity(self, entity: dict) -> tuple:
+        return (
+            entity[CONF_PLATFORM],
+            entity.get(ONESMART_KEY),
+            entity.get(ONESMART_KEY_MODE),
+            entity.get(ONESMART_KEY_TEMPERATURE),
+            entity.get(ONESMART_SUFFIX)
+        )
+
+    """Describe the entities of a device from its definition"""
+    def discover_device_entities(self, device: Device, definition: dict) -> list:
+        entities = []
+        device_id = device.id
+        device_name = device.name
+
+        attributes = [
+            ApparatusAttribute.from_dict(attribute)
+            for attribute in definition[OneSmartFieldName.ATTRIBUTES]
+        ]
+        self.device_apparatus_attributes[device_id] = dict()
+
+        device_attribute_names = frozenset(attribute.name for attribute in attributes)
+        self.device_attribute_names[device_id] = device_attribute_names
+
+        for platform_name, entity_template, entity_template_keys in match_entity_templates(device_attribute_names):
+            entity = dict()
+            entity[CONF_PLATFORM] = platform_name
+            entity[ONESMART_CACHE] = (OneSmartCommand.APPARATUS,OneSmartAction.GET)
+            entity[ATTR_NAME] = None
+            entity[CONF_DEVICE_ID] = device_id
+            entity[OneSmartUpdateTopic] = OneSmartUpdateTopic.APPARATUS
+            entity = entity | entity_template
+
+            for entity_template_key in entity_template:
+                key = entity_template[entity_template_key]
+                if isinstance(key, str):
+                    entity[entity_template_key] = f"{device_id}.{key}"
+
+            # Append the entity
+            entities.append(entity)
+
+            # Mark the attribute for polling
+            for attribute_name in entity_template_keys:
+                self.device_apparatus_attributes[device_id][attribute_name] = attribute_name
+
+        for attribute in attributes:
+            attribute_name: str = attribute.name
+            entity = dict()
+            entity[ONESMART_CACHE] = (OneSmartCommand.APPARATUS,OneSmartAction.GET)
+            entity[ONESMART_KEY] = f"{device_id}.{attribute_name}"
+            entity[CONF_DEVICE_ID] = device_id
+            entity[ATTR_NAME] = f"{attribute_name.replace('_',' ').title()}"
+            entity[OneSmartUpdateTopic] = OneSmartUpdateTopic.APPARATUS
+            use_entity = False
+
+            if attribute.access == OneSmartAccessLevel.READ:
+                if attribute.type in [OneSmartDataType.NUMBER, OneSmartDataType.REAL]:
+
+                    entity[CONF_PLATFORM] = Platform.SENSOR
+                    entity[ATTR_STATE_CLASS] = SensorStateClass.MEASUREMENT
+
+                    properties = match_sensor_attribute(device.type, attribute_name)
+                    if properties != None:
+                        entity |= properties
+                        use_entity = True
+
+                elif attribute.type in [OneSmartDataType.STRING]:
+                    entity[CONF_PLATFORM] = Platform.SENSOR
+                    use_entity = True
+
+            elif attribute.access == OneSmartAccessLevel.READWRITE:
+                if "operating_mode" in attribute_name:
+                    entity[CONF_PLATFORM] = Platform.SENSOR
+                    use_entity = True
+                elif attribute.enum is not None:
+                    enum_values = attribute.enum
+                    if "on" in enum_values and "off" in enum_values:
+                        entity[CONF_PLATFORM] = Platform.SWITCH
+                        entity[SERVICE_TURN_ON] = {
+                            "command":OneSmartCommand.APPARATUS, 
+                            OneSmartFieldName.ACTION:OneSmartAction.SET, 
+                            OneSmartFieldName.ID:device_id, 
+                            OneSmartFieldName.ATTRIBUTES:{attribute_name:"on"}
+                        }
+                        entity[SERVICE_TURN_OFF] = {
+                            "command":OneSmartCommand.APPARATUS, 
+                            OneSmartFieldName.ACTION:OneSmartAction.SET, 
+                            OneSmartFieldName.ID:device_id, 
+                            OneSmartFieldName.ATTRIBUTES:{attribute_name:"off"}
+                        }
+
+                        entity[STATE_ON] = "on"
+                        entity[STATE_OFF] = "off"
+                        use_entity = True
+                elif "outputvalue" == attribute_name:
+                    if device.group == OneSmartGroupType.LIGHTS:
+                        if attribute.type == OneSmartDataType.NUMBER:
+                            entity[CONF_PLATFORM] = Platform.LIGHT
+                            if "LID" in device.type:
+                                output_mode = definition.get(OneSmartFieldName.OUTPUT_MODE, OneSmartOutputMode.OFF)
+                                if output_mode == OneSmartOutputMode.DIMMER:
+                                    entity[ATTR_SUPPORTED_COLOR_MODES] = [ColorMode.BRIGHTNESS]
+                                else:
+                                    entity[ATTR_SUPPORTED_COLOR_MODES] = [ColorMode.ONOFF]
 
-                for attribute in attributes:
-                    attribute_name: str = attribute[OneSmartFieldName.NAME]
-                    entity = dict()
-                    entity[ONESMART_CACHE] = (OneSmartCommand.APPARATUS,OneSmartAction.GET)
-                    entity[ONESMART_KEY] = f"{device_id}.{attribute_name}"
-                    entity[CONF_DEVICE_ID] = device_id
-                    entity[ATTR_NAME] = f"{attribute_name.replace('_',' ').title()}"
-                    entity[OneSmartUpdateTopic] = OneSmartUpdateTopic.APPARATUS
-                    use_entity = False
-
-                    if attribute[OneSmartFieldName.ACCESS] == OneSmartAccessLevel.READ:
-                        if attribute[OneSmartFieldName.TYPE] in [OneSmartDataType.NUMBER, OneSmartDataType.REAL]:
-                            
-                            entity[CONF_PLATFORM] = Platform.SENSOR
-                            entity[ATTR_STATE_CLASS] = SensorStateClass.MEASUREMENT
-                            
-                            # Temperature sensors
-                            if "_temp" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = UnitOfTemperature.CELSIUS
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.TEMPERATURE
-                                use_entity = True
-
-                            elif "_percent" in attribute_name or "efficiency" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = PERCENTAGE
-                                use_entity = True
-                            
-                            elif "co2_level" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = CONCENTRATION_PARTS_PER_MILLION
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.CO2
-                                use_entity = True
-                            
-                            elif "_rpm" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = "rpm"
-                                use_entity = True
-                            
-                            elif "flow_rate_4graph" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = f"{UnitOfVolume.LITERS}/{UnitOfTime.MINUTES}"
-                                use_entity = True
-                              
-                            elif "_power" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = UnitOfPower.WATT
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.POWER
-                                if "reactive" in attribute_name:
-                                    entity[ATTR_UNIT_OF_MEASUREMENT] = None
-                                    entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.POWER_FACTOR
-
-                                use_entity = True
-
-                            elif "current" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = UnitOfElectricCurrent.AMPERE
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.CURRENT
-                                use_entity = True
-                            
-                            elif "voltage" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = UnitOfElectricPotential.VOLT
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.VOLTAGE
-                                use_entity = True
-                            
-                            elif "frequency" in attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = UnitOfFrequency.HERTZ
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.FREQUENCY
-                                use_entity = True
-
-                            elif "e_total" == attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = UnitOfEnergy.KILO_WATT_HOUR
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.ENERGY
-                                entity[ATTR_STATE_CLASS] = SensorStateClass.TOTAL
-                                use_entity = True
-
-                            elif "e_day" == attribute_name:
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = UnitOfEnergy.KILO_WATT_HOUR
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.ENERGY
-                                entity[ATTR_STATE_CLASS] = SensorStateClass.TOTAL_INCREASING
-                                use_entity = True
-                            
-                            elif "_energy_" in attribute_name and device[OneSmartFieldName.TYPE] == "ENERGY_PROCON_ATW":
-                                entity[ATTR_UNIT_OF_MEASUREMENT] = UnitOfEnergy.WATT_HOUR
-                                entity[ATTR_DEVICE_CLASS] = SensorDeviceClass.ENERGY
-                                entity[ATTR_STATE_CLASS] = SensorStateClass.TOTAL_INCREASING
-                                use_entity = True
-
-                        elif attribute[OneSmartFieldName.TYPE] in [OneSmartDataType.STRING]:
-                            entity[CONF_PLATFORM] = Platform.SENSOR
-                            use_entity = True
 
-                    elif attribute[OneSmartFieldName.ACCESS] == OneSmartAccessLevel.READWRITE:
-                        if "operating_mode" in attribute_name:
-                            entity[CONF_PLATFORM] = Platform.SENSOR
-                            use_entity = True
-                        elif OneSmartFieldName.ENUM in attribute:
-                            enum_values = attribute[OneSmartFieldName.ENUM]
-                            if "on" in enum_values and "off" in enum_values:
-                                entity[CONF_PLATFORM] = Platform.SWITCH
                                 entity[SERVICE_TURN_ON] = {
                                     "command":OneSmartCommand.APPARATUS, 
                                     OneSmartFieldName.ACTION:OneSmartAction.SET, 
                                     OneSmartFieldName.ID:device_id, 
-                                    OneSmartFieldName.ATTRIBUTES:{attribute_name:"on"}
+                                    OneSmartFieldName.ATTRIBUTES:{attribute_name:COMMAND_REPLACE_VALUE}
                                 }
-                                entity[SERVICE_TURN_OFF] = {
+                            else:
+                                entity[ATTR_SUPPORTED_COLOR_MODES] = [ColorMode.ONOFF]
+                                entity[SERVICE_TURN_ON] = {
                                     "command":OneSmartCommand.APPARATUS, 
                                     OneSmartFieldName.ACTION:OneSmartAction.SET, 
                                     OneSmartFieldName.ID:device_id, 
-                                    OneSmartFieldName.ATTRIBUTES:{attribute_name:"off"}
+                                    OneSmartFieldName.ATTRIBUTES:{attribute_name:255}
                                 }
-            
-                                entity[STATE_ON] = "on"
-                                entity[STATE_OFF] = "off"
-                                use_entity = True
-                        elif "outputvalue" == attribute_name:
-                            if device[OneSmartFieldName.GROUP] == OneSmartGroupType.LIGHTS:
-                                if attribute[OneSmartFieldName.TYPE] == OneSmartDataType.NUMBER:
-                                    entity[CONF_PLATFORM] = Platform.LIGHT
-                                    if "LID" in device[OneSmartFieldName.TYPE]:
-                                        outputmode_response = await self.command_wait(SOCKET_POLL, 
-                                            command=OneSmartCommand.APPARATUS,
-                                            action=OneSmartAction.GET,
-                                            id=device_id,
-                                            attributes=[OneSmartFieldName.OUTPUT_MODE]
-                                        )
-                                        output_mode = outputmode_response.get(OneSmartFieldName.RESULT, dict()).get(OneSmartFieldName.ATTRIBUTES, dict()).get(OneSmartFieldName.OUTPUT_MODE, OneSmartOutputMode.OFF)
-                                        if output_mode == OneSmartOutputMode.DIMMER:
-                                            entity[ATTR_SUPPORTED_COLOR_MODES] = [ColorMode.BRIGHTNESS]
-                                        else:
-                                            entity[ATTR_SUPPORTED_COLOR_MODES] = [ColorMode.ONOFF]
-
-                                        
-                                        entity[SERVICE_TURN_ON] = {
-                                            "command":OneSmartCommand.APPARATUS, 
-                                            OneSmartFieldName.ACTION:OneSmartAction.SET, 
-                                            OneSmartFieldName.ID:device_id, 
-                                            OneSmartFieldName.ATTRIBUTES:{attribute_name:COMMAND_REPLACE_VALUE}
-                                        }
-                                    else:
-                                        entity[ATTR_SUPPORTED_COLOR_MODES] = [ColorMode.ONOFF]
-                                        entity[SERVICE_TURN_ON] = {
-                                            "command":OneSmartCommand.APPARATUS, 
-                                            OneSmartFieldName.ACTION:OneSmartAction.SET, 
-                                            OneSmartFieldName.ID:device_id, 
-                                            OneSmartFieldName.ATTRIBUTES:{attribute_name:255}
-                                        }
-
-                                    entity[STATE_OFF] = 0
-                                    entity[ATTR_NAME] = device_name
-                                    
-                                    entity[SERVICE_TURN_OFF] = {
-                                        "command":OneSmartCommand.APPARATUS, 
-                                        OneSmartFieldName.ACTION:OneSmartAction.SET, 
-                                        OneSmartFieldName.ID:device_id, 
-                                        OneSmartFieldName.ATTRIBUTES:{attribute_name:0}
-                                    }
-                                    use_entity = True
-
-                    if use_entity == True:
-                        # Append the entity
-                        self.entities[entity[CONF_PLATFORM]].append(entity)
-
-                        # Mark the attribute for polling
-                        self.device_apparatus_attributes[device_id][attribute[OneSmartFieldName.NAME]] = attribute
-  
-            except Exception as e:
-                _LOGGER.error(f"Error while discovering entities for device { device[OneSmartFieldName.NAME] }: { e }")
 
-        # Preset entities
-        for room_id in self.cache[(OneSmartCommand.ROOM,OneSmartAction.LIST)]:
-            try:
-                room = self.cache[(OneSmartCommand.ROOM,OneSmartAction.LIST)][room_id]
-                room_name = room[OneSmartFieldName.NAME]
-                if(room[OneSmartFieldName.VISIBLE] == False):
-                    continue
+                            entity[STATE_OFF] = 0
+                            entity[ATTR_NAME] = device_name
 
-                room_presets = dict()
-                for group_name in OneSmartGroupType:
-                    room_presets[group_name] = dict()
-            
-                for preset_id in self.cache[(OneSmartCommand.PRESET,OneSmartAction.LIST)]:
-                    preset = self.cache[(OneSmartCommand.PRESET,OneSmartAction.LIST)][preset_id]
-                    if preset[OneSmartCommand.ROOM] == room_id:
-                        room_presets[preset[OneSmartFieldName.GROUP]][preset[OneSmartFieldName.TYPE]] = preset
-
-                for group_name in room_presets:
-                    group_presets = room_presets[group_name]
-
-                    entity = dict()
-                    entity[ONESMART_CACHE] = (OneSmartCommand.PRESET,OneSmartAction.LIST)
-                    entity[OneSmartUpdateTopic] = OneSmartUpdateTopic.POLL
-                    entity[CONF_PLATFORM] = Platform.SELECT
-                    entity[ATTR_OPTIONS] = dict()
-                    entity[SERVICE_SELECT_OPTION] = dict()
-                    entity[ATTR_NAME] = f"{room_name} {group_name.title()} Preset"
-                    entity[ONESMART_KEY] = f"{room_id}.{group_name}"
-
-                    for preset_type in group_presets:
-                        preset = group_presets[preset_type]
-                        preset_name = preset[OneSmartFieldName.NAME]
-                        preset_id = preset[OneSmartFieldName.ID]
-                        entity[ATTR_OPTIONS][f"{preset_id}.{OneSmartFieldName.ACTIVE}"] = preset_name
-                        entity[SERVICE_SELECT_OPTION][preset_name] = {
-                            "command":OneSmartCommand.PRESET,
-                            OneSmartFieldName.ACTION:OneSmartAction.PERFORM,
-                            OneSmartFieldName.ID:preset_id
-                        }
+                            entity[SERVICE_TURN_OFF] = {
+                                "command":OneSmartCommand.APPARATUS, 
+                                OneSmartFieldName.ACTION:OneSmartAction.SET, 
+                                OneSmartFieldName.ID:device_id, 
+                                OneSmartFieldName.ATTRIBUTES:{attribute_name:0}
+                            }
+                            use_entity = True
 
-                    if len(group_presets) >= 2:
-                        # Append the entity
-                        self.entities[entity[CONF_PLATFORM]].append(entity)
+            if use_entity == True:
+                # Append the entity
+                entities.append(entity)
+
+                # Mark the attribute for polling
+                self.device_apparatus_attributes[device_id][attribute.name] = attribute
+
+        self.poll_scheduler.set_attributes(device_id, self.device_apparatus_attributes[device_id], time())
+
+        return entities
+
+    """Describe the preset select entities of a room"""
+    def discover_room_entities(self, room: Room) -> list:
+        entities = []
+        room_id = room.id
+        room_name = room.name
+
+        room_presets = dict()
+        for group_name in OneSmartGroupType:
+            room_presets[group_name] = dict()
+
+        for preset_id in self.cache[(OneSmartCommand.PRESET,OneSmartAction.LIST)]:
+            preset: Preset = self.cache[(OneSmartCommand.PRESET,OneSmartAction.LIST)][preset_id]
+            if preset.room == room_id:
+                room_presets[preset.group][preset.type] = preset
+
+        for group_name in room_presets:
+            group_presets = room_presets[group_name]
+
+            entity = dict()
+            entity[ONESMART_CACHE] = (OneSmartCommand.PRESET,OneSmartAction.LIST)
+            entity[OneSmartUpdateTopic] = OneSmartUpdateTopic.POLL
+            entity[CONF_PLATFORM] = Platform.SELECT
+            entity[ATTR_OPTIONS] = dict()
+            entity[SERVICE_SELECT_OPTION] = dict()
+            entity[ATTR_NAME] = f"{room_name} {group_name.title()} Preset"
+            entity[ONESMART_KEY] = f"{room_id}.{group_name}"
+
+            for preset_type in group_presets:
+                preset = group_presets[preset_type]
+                preset_name = preset.name
+                preset_id = preset.id
+                entity[ATTR_OPTIONS][f"{preset_id}.{OneSmartFieldName.ACTIVE}"] = preset_name
+                entity[SERVICE_SELECT_OPTION][preset_name] = {
+                    "command":OneSmartCommand.PRESET,
+                    OneSmartFieldName.ACTION:OneSmartAction.PERFORM,
+                    OneSmartFieldName.ID:preset_id
+                }
+
+            if len(group_presets) >= 2:
+                # Append the entity
+                entities.append(entity)
+
+        return entities
+
+    """Describe the power and energy sensors of a meter"""
+    def discover_meter_entities(self, meter: Meter) -> list:
+        return [
+            {
+                CONF_PLATFORM: Platform.SENSOR,
+                ONESMART_CACHE: OneSmartEventType.ENERGY_CONSUMPTION,
+                OneSmartUpdateTopic: OneSmartUpdateTopic.PUSH,
+                ONESMART_UPDATE_TARGET: meter.id,
+                ONESMART_KEY: meter.id,
+                ONESMART_SUFFIX: "power",
+                ATTR_NAME: meter.name,
+                ATTR_UNIT_OF_MEASUREMENT: UnitOfPower.WATT,
+                ATTR_DEVICE_CLASS: SensorDeviceClass.POWER,
+                ATTR_STATE_CLASS: SensorStateClass.MEASUREMENT
+            },
+            {
+                CONF_PLATFORM: Platform.SENSOR,
+                ONESMART_CACHE: (OneSmartCommand.ENERGY,OneSmartAction.TOTAL),
+                OneSmartUpdateTopic: OneSmartUpdateTopic.POLL,
+                ONESMART_UPDATE_TARGET: meter.id,
+                ONESMART_KEY: meter.id,
+                ONESMART_SUFFIX: "energy",
+                ATTR_NAME: meter.name,
+                ATTR_UNIT_OF_MEASUREMENT: UnitOfEnergy.WATT_HOUR,
+                ATTR_DEVICE_CLASS: SensorDeviceClass.ENERGY,
+                ATTR_STATE_CLASS: SensorStateClass.TOTAL
+            }
+        ]
+
+
+    """Fetch the apparatus attributes of a device, and the output mode of LID lights"""
+    async def fetch_device_definition(self, device: Device) -> dict:
+        transaction = await self.command_wait(SOCKET_POLL, OneSmartCommand.APPARATUS, action=OneSmartAction.LIST, id=device.id)
+        attributes = transaction[OneSmartFieldName.RESULT][OneSmartFieldName.ATTRIBUTES]
+        definition = { OneSmartFieldName.ATTRIBUTES: attributes }
+
+        attribute_names = [attribute[OneSmartFieldName.NAME] for attribute in attributes]
+        if device.group == OneSmartGroupType.LIGHTS and "LID" in (device.type or "") and "outputvalue" in attribute_names:
+            outputmode_response = await self.command_wait(SOCKET_POLL, 
+                command=OneSmartCommand.APPARATUS,
+                action=OneSmartAction.GET,
+                id=device.id,
+                attributes=[OneSmartFieldName.OUTPUT_MODE]
+            )
+            definition[OneSmartFieldName.OUTPUT_MODE] = outputmode_response.get(OneSmartFieldName.RESULT, dict()).get(OneSmartFieldName.ATTRIBUTES, dict()).get(OneSmartFieldName.OUTPUT_MODE, OneSmartOutputMode.OFF)
 
-            except Exception as e:
-                _LOGGER.error(f"Error while discovering entities for room { room[OneSmartFieldName.NAME] }: { e }")
+        return definition
+
+    """Fetch the definitions of multiple devices with bounded concurrency, skipping devices that fail or time out"""
+    async def fetch_device_definitions(self, devices: list) -> dict:
+        semaphore = asyncio.Semaphore(DISCOVERY_CONCURRENCY)
+
+        async def fetch(device: Device):
+            async with semaphore:
+                async with asyncio.timeout(DISCOVERY_DEVICE_TIMEOUT):
+                    return await self.fetch_device_definition(device)
+
+        results = await asyncio.gather(*[fetch(device) for device in devices], return_exceptions=True)
+
+        definitions = dict()
+        for device, result in zip(devices, results):
+            if isinstance(result, asyncio.TimeoutError):
+                _LOGGER.warning(f"Fetching the definition of device { device.name } timed out after { DISCOVERY_DEVICE_TIMEOUT } seconds")
+            elif isinstance(result, Exception):
+                _LOGGER.error(f"Error while fetching the definition of device { device.name }: { result }")
+            else:
+                definitions[device.id] = result
+        return definitions
+
+    """Load the device definitions stored for this site and software version"""
+    async def load_discovery_cache(self) -> bool:
+        site = self.cache[(OneSmartCommand.SITE,OneSmartAction.GET)]
+        self.discovery_store = Store(self.hass, STORAGE_VERSION, STORAGE_KEY_DISCOVERY.format(site.get(OneSmartFieldName.NODEID)))
+
+        try:
+            data = await self.discovery_store.async_load()
+        except Exception as e:
+            _LOGGER.warning(f"Could not load stored device definitions: { e }")
+            return False
+
+        if data == None or data.get(OneSmartFieldName.VERSION) != site.get(OneSmartFieldName.VERSION):
+            return False
+
+        for entry in data[OneSmartFieldName.DEVICES]:
+            device_id = entry[OneSmartFieldName.ID]
+            self.device_definitions[device_id] = {key: value for key, value in entry.items() if key != OneSmartFieldName.ID}
+
+        _LOGGER.info(f"Loaded stored definitions for { len(self.device_definitions) } devices")
+        return True
+
+    """Store the device definitions of the current devices"""
+    async def save_discovery_cache(self):
+        if self.discovery_store == None:
+            return
+
+        site = self.cache[(OneSmartCommand.SITE,OneSmartAction.GET)]
+        devices = self.cache[(OneSmartCommand.DEVICE,OneSmartAction.LIST)]
+        await self.discovery_store.async_save({
+            OneSmartFieldName.VERSION: site.get(OneSmartFieldName.VERSION),
+            OneSmartFieldName.DEVICES: [
+                { OneSmartFieldName.ID: device_id } | definition
+                for device_id, definition in self.device_definitions.items() if device_id in devices
+            ]
+        })
+
+    """Get the device id for a device registry identifier, which may have been stored as a string"""
+    def get_device_id(self, identifier):
+        devices = self.cache[(OneSmartCommand.DEVICE,OneSmartAction.LIST)]
+        if identifier in devices:
+            return identifier
+        for device_id in devices:
+            if str(device_id) == str(identifier):
+                return device_id
+        return None
 
-        for platform_name in Platform:
-            platform_entities = self.entities[platform_name]
-            if(len(platform_entities) > 0):
-                _LOGGER.info(f"Discovered { len(platform_entities) } entities for platform { platform_name }")
-                
     def get_platform_entities(self, platform: Platform):
         if platform in self.entities:
             return self.entities[platform]
@@ -12,7 +12,7 @@ from homeassistant.components.select import (
 )
 from homeassistant.core import HomeAssistant
 
-from .onesmartentity import OneSmartEntity
+from .onesmartentity import OneSmartEntity, async_setup_discovered_entities
 from .onesmartwrapper import OneSmartWrapper
 
 from .const import * 
@@ -22,11 +22,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
 
     wrapper: OneSmartWrapper = hass.data[DOMAIN][entry.entry_id][ONESMART_WRAPPER]
 
-    entities = []
-    
-    wrapper_entities = wrapper.get_platform_entities(Platform.SELECT)
-
-    for wrapper_entity in wrapper_entities:
+    def create_entity(wrapper_entity):
         optional_attributes = [
             CONF_DEVICE_ID, STATE_ON
         ]
@@ -35,24 +31,21 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
             if not optional_attribute in wrapper_entity:
                 wrapper_entity[optional_attribute] = None
 
-        entities.append(
-            OneSmartSelect(
-                hass,
-                entry,
-                wrapper,
-                update_topic=wrapper_entity[OneSmartUpdateTopic],
-                source=wrapper_entity[ONESMART_CACHE],
-                key=wrapper_entity[ONESMART_KEY],
-                name=wrapper_entity[ATTR_NAME],
-                device_id=wrapper_entity[CONF_DEVICE_ID],
-                options=wrapper_entity[ATTR_OPTIONS],
-                options_commands=wrapper_entity[SERVICE_SELECT_OPTION],
-                state_on=wrapper_entity[STATE_ON]
-            )
+        return OneSmartSelect(
+            hass,
+            entry,
+            wrapper,
+            update_topic=wrapper_entity[OneSmartUpdateTopic],
+            source=wrapper_entity[ONESMART_CACHE],
+            key=wrapper_entity[ONESMART_KEY],
+            name=wrapper_entity[ATTR_NAME],
+            device_id=wrapper_entity[CONF_DEVICE_ID],
+            options=wrapper_entity[ATTR_OPTIONS],
+            options_commands=wrapper_entity[SERVICE_SELECT_OPTION],
+            state_on=wrapper_entity[STATE_ON]
         )
 
-
-    async_add_entities(entities)
+    async_setup_discovered_entities(hass, entry, wrapper, Platform.SELECT, async_add_entities, create_entity)
     
 class OneSmartSelect(OneSmartEntity, SelectEntity):
     def __init__(
@@ -96,6 +89,8 @@ class OneSmartSelect(OneSmartEntity, SelectEntity):
 
     @property
     def available(self) -> bool:
+        if not super().available:
+            return False
         for option_key in self._options:
             option_state = self.get_cache_value(option_key)
             if option_state is None:
@@ -105,5 +100,5 @@ class OneSmartSelect(OneSmartEntity, SelectEntity):
 
     async def async_select_option(self, option: str) -> None:
         command = self._options_commands[option]
-        await self.wrapper.command(SOCKET_PUSH, **command)
+        await self.wrapper.command(SOCKET_PUSH, priority=OneSmartCommandPriority.INTERACTIVE, forget=True, **command)
         self.wrapper.set_update_flag(self._source)
@@ -11,12 +11,9 @@ from homeassistant.components.sensor import (
     ATTR_STATE_CLASS,
     SensorEntity
 )
-from homeassistant.components.sensor.const import (
-    UnitOfPower, UnitOfEnergy
-)
 from homeassistant.core import HomeAssistant
 
-from .onesmartentity import OneSmartEntity
+from .onesmartentity import OneSmartEntity, async_setup_discovered_entities
 from .onesmartwrapper import OneSmartWrapper
 
 from .const import * 
@@ -26,44 +23,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
 
     wrapper: OneSmartWrapper = hass.data[DOMAIN][entry.entry_id][ONESMART_WRAPPER]
 
-    cache = wrapper.get_cache()
-
     entities = []
 
-    # Meter sensors (Energy & Power)
-    for meter in cache[(OneSmartCommand.METER,OneSmartAction.LIST)]:
-        entities.append(
-            OneSmartSensor(
-                hass,
-                entry,
-                wrapper,
-                update_topic=OneSmartUpdateTopic.PUSH,
-                key=meter[OneSmartFieldName.ID],
-                name=meter[OneSmartFieldName.NAME],
-                suffix="power",
-                source=OneSmartEventType.ENERGY_CONSUMPTION,
-                unit=UnitOfPower.WATT,
-                device_class=SensorDeviceClass.POWER,
-                state_class=SensorStateClass.MEASUREMENT
-            )
-        )
-
-        entities.append(
-            OneSmartSensor(
-                hass,
-                entry,
-                wrapper,
-                update_topic=OneSmartUpdateTopic.POLL,
-                key=meter[OneSmartFieldName.ID],
-                name=meter[OneSmartFieldName.NAME],
-                suffix="energy",
-                source=(OneSmartCommand.ENERGY,OneSmartAction.TOTAL),
-                unit=UnitOfEnergy.WATT_HOUR,
-                device_class=SensorDeviceClass.ENERGY,
-                state_class=SensorStateClass.TOTAL
-            )
-        )
-
     # Site sensors
     entities.append(
         OneSmartSensor(
@@ -78,35 +39,35 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
         )
     )
 
-    wrapper_entities = wrapper.get_platform_entities(Platform.SENSOR)
+    async_add_entities(entities)
 
-    for wrapper_entity in wrapper_entities:
+    # Device and meter sensors (Energy & Power)
+    def create_entity(wrapper_entity):
         optional_attributes = [
-            ATTR_UNIT_OF_MEASUREMENT, ATTR_DEVICE_CLASS, ATTR_STATE_CLASS, CONF_DEVICE_ID, 
+            ATTR_UNIT_OF_MEASUREMENT, ATTR_DEVICE_CLASS, ATTR_STATE_CLASS, CONF_DEVICE_ID, ONESMART_SUFFIX, ONESMART_UPDATE_TARGET
         ]
 
         for optional_attribute in optional_attributes:
             if not optional_attribute in wrapper_entity:
                 wrapper_entity[optional_attribute] = None
 
-        entities.append(
-            OneSmartSensor(
-                hass,
-                entry,
-                wrapper,
-                update_topic=OneSmartUpdateTopic.APPARATUS,
-                source=wrapper_entity[ONESMART_CACHE],
-                key=wrapper_entity[ONESMART_KEY],
-                name=wrapper_entity[ATTR_NAME],
-                device_id=wrapper_entity[CONF_DEVICE_ID],
-                unit=wrapper_entity[ATTR_UNIT_OF_MEASUREMENT],
-                device_class=wrapper_entity[ATTR_DEVICE_CLASS],
-                state_class=wrapper_entity[ATTR_STATE_CLASS]
-            )
+        return OneSmartSensor(
+            hass,
+            entry,
+            wrapper,
+            update_topic=wrapper_entity[OneSmartUpdateTopic],
+            update_target=wrapper_entity[ONESMART_UPDATE_TARGET],
+            source=wrapper_entity[ONESMART_CACHE],
+            key=wrapper_entity[ONESMART_KEY],
+            name=wrapper_entity[ATTR_NAME],
+            suffix=wrapper_entity[ONESMART_SUFFIX],
+            device_id=wrapper_entity[CONF_DEVICE_ID],
+            unit=wrapper_entity[ATTR_UNIT_OF_MEASUREMENT],
+            device_class=wrapper_entity[ATTR_DEVICE_CLASS],
+            state_class=wrapper_entity[ATTR_STATE_CLASS]
         )
 
-
-    async_add_entities(entities)
+    async_setup_discovered_entities(hass, entry, wrapper, Platform.SENSOR, async_add_entities, create_entity)
     
 class OneSmartSensor(OneSmartEntity, SensorEntity):
     def __init__(
@@ -124,9 +85,10 @@ class OneSmartSensor(OneSmartEntity, SensorEntity):
         icon = None,
         device_class: SensorDeviceClass = None,
         state_class: SensorStateClass = None,
-        precision: int = None
+        precision: int = None,
+        update_target = None
     ):
-        super().__init__(hass, config_entry, wrapper, update_topic, source, device_id, name, suffix, icon)
+        super().__init__(hass, config_entry, wrapper, update_topic, source, device_id, name, suffix, icon, update_target)
         self.wrapper = wrapper
         self._key = key
         
@@ -142,4 +104,4 @@ class OneSmartSensor(OneSmartEntity, SensorEntity):
     @property
     def available(self) -> bool:      
         value = self.get_cache_value(self._key)
-        return value is not None
+        return super().available and value is not None
@@ -12,7 +12,7 @@ from homeassistant.components.switch import (
 )
 from homeassistant.core import HomeAssistant
 
-from .onesmartentity import OneSmartEntity
+from .onesmartentity import OneSmartEntity, async_setup_discovered_entities
 from .onesmartwrapper import OneSmartWrapper
 
 from .const import * 
@@ -22,11 +22,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
 
     wrapper: OneSmartWrapper = hass.data[DOMAIN][entry.entry_id][ONESMART_WRAPPER]
 
-    entities = []
-    
-    wrapper_entities = wrapper.get_platform_entities(Platform.SWITCH)
-
-    for wrapper_entity in wrapper_entities:
+    def create_entity(wrapper_entity):
         optional_attributes = [
             CONF_DEVICE_ID, ATTR_DEVICE_CLASS, SERVICE_TURN_ON, SERVICE_TURN_OFF, STATE_ON
         ]
@@ -35,25 +31,22 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
             if not optional_attribute in wrapper_entity:
                 wrapper_entity[optional_attribute] = None
 
-        entities.append(
-            OneSmartSwitch(
-                hass,
-                entry,
-                wrapper,
-                update_topic=wrapper_entity[OneSmartUpdateTopic],
-                source=wrapper_entity[ONESMART_CACHE],
-                key=wrapper_entity[ONESMART_KEY],
-                name=wrapper_entity[ATTR_NAME],
-                device_id=wrapper_entity[CONF_DEVICE_ID],
-                device_class=wrapper_entity[ATTR_DEVICE_CLASS],
-                command_on=wrapper_entity[SERVICE_TURN_ON],
-                command_off=wrapper_entity[SERVICE_TURN_OFF],
-                state_on=wrapper_entity[STATE_ON]
-            )
+        return OneSmartSwitch(
+            hass,
+            entry,
+            wrapper,
+            update_topic=wrapper_entity[OneSmartUpdateTopic],
+            source=wrapper_entity[ONESMART_CACHE],
+            key=wrapper_entity[ONESMART_KEY],
+            name=wrapper_entity[ATTR_NAME],
+            device_id=wrapper_entity[CONF_DEVICE_ID],
+            device_class=wrapper_entity[ATTR_DEVICE_CLASS],
+            command_on=wrapper_entity[SERVICE_TURN_ON],
+            command_off=wrapper_entity[SERVICE_TURN_OFF],
+            state_on=wrapper_entity[STATE_ON]
         )
 
-
-    async_add_entities(entities)
+    async_setup_discovered_entities(hass, entry, wrapper, Platform.SWITCH, async_add_entities, create_entity)
     
 class OneSmartSwitch(OneSmartEntity, SwitchEntity):
     def __init__(
@@ -93,12 +86,10 @@ class OneSmartSwitch(OneSmartEntity, SwitchEntity):
     @property
     def available(self) -> bool:
         value = self.get_cache_value(self._key)
-        return value is not None
+        return super().available and value is not None
 
     async def async_turn_on(self, **kwargs):
-        await self.wrapper.command(SOCKET_PUSH, **self._command_on)
-        self.wrapper.set_update_flag(self._source)
+        await self.wrapper.set_apparatus(self._command_on[OneSmartFieldName.ID], self._command_on[OneSmartFieldName.ATTRIBUTES])
 
     async def async_turn_off(self, **kwargs):
-        await self.wrapper.command(SOCKET_PUSH, **self._command_off)
-        self.wrapper.set_update_flag(self._source)
\ No newline at end of file
+        await self.wrapper.set_apparatus(self._command_off[OneSmartFieldName.ID], self._command_off[OneSmartFieldName.ATTRIBUTES])
\ No newline at end of file
@@ -15,7 +15,7 @@ from homeassistant.components.water_heater import (
 )
 from homeassistant.core import HomeAssistant
 
-from .onesmartentity import OneSmartEntity
+from .onesmartentity import OneSmartEntity, async_setup_discovered_entities
 from .onesmartwrapper import OneSmartWrapper
 
 from .const import * 
@@ -25,11 +25,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
 
     wrapper: OneSmartWrapper = hass.data[DOMAIN][entry.entry_id][ONESMART_WRAPPER]
 
-    entities = []
-    
-    wrapper_entities = wrapper.get_platform_entities(Platform.WATER_HEATER)
-
-    for wrapper_entity in wrapper_entities:
+    def create_entity(wrapper_entity):
         optional_attributes = [
             CONF_DEVICE_ID, ATTR_DEVICE_CLASS
         ]
@@ -38,25 +34,22 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
             if not optional_attribute in wrapper_entity:
                 wrapper_entity[optional_attribute] = None
 
-        entities.append(
-            OneSmartWaterHeater(
-                hass,
-                entry,
-                wrapper,
-                update_topic=wrapper_entity[OneSmartUpdateTopic],
-                source=wrapper_entity[ONESMART_CACHE],
-                key_mode=wrapper_entity[ONESMART_KEY_MODE],
-                key_temperature=wrapper_entity[ONESMART_KEY_TEMPERATURE],
-                key_target_temperature=wrapper_entity[ONESMART_KEY_TARGET_TEMPERATURE],
-                name=wrapper_entity[ATTR_NAME],
-                device_id=wrapper_entity[CONF_DEVICE_ID],
-                operation_commands = wrapper_entity[ATTR_OPERATION_LIST],
-                features = WaterHeaterEntityFeature.TARGET_TEMPERATURE | WaterHeaterEntityFeature.OPERATION_MODE
-            )
+        return OneSmartWaterHeater(
+            hass,
+            entry,
+            wrapper,
+            update_topic=wrapper_entity[OneSmartUpdateTopic],
+            source=wrapper_entity[ONESMART_CACHE],
+            key_mode=wrapper_entity[ONESMART_KEY_MODE],
+            key_temperature=wrapper_entity[ONESMART_KEY_TEMPERATURE],
+            key_target_temperature=wrapper_entity[ONESMART_KEY_TARGET_TEMPERATURE],
+            name=wrapper_entity[ATTR_NAME],
+            device_id=wrapper_entity[CONF_DEVICE_ID],
+            operation_commands = wrapper_entity[ATTR_OPERATION_LIST],
+            features = WaterHeaterEntityFeature.TARGET_TEMPERATURE | WaterHeaterEntityFeature.OPERATION_MODE
         )
 
-
-    async_add_entities(entities)
+    async_setup_discovered_entities(hass, entry, wrapper, Platform.WATER_HEATER, async_add_entities, create_entity)
     
 class OneSmartWaterHeater(OneSmartEntity, WaterHeaterEntity):
     def __init__(
@@ -90,7 +83,7 @@ class OneSmartWaterHeater(OneSmartEntity, WaterHeaterEntity):
     @property
     def available(self) -> bool:
         value = self.get_cache_value(self._key_mode)
-        return value is not None
+        return super().available and value is not None
 
     @property
     def temperature_unit(self):
@@ -100,23 +93,13 @@ class OneSmartWaterHeater(OneSmartEntity, WaterHeaterEntity):
         mode_value = self._operation_commands[operation_mode]
         mode_key = self._key_mode.split(".")[-1]
         if mode_value != None:
-            command_mode = {
-                "command":self._source[0], OneSmartFieldName.ACTION:OneSmartAction.SET, OneSmartFieldName.ID:self._device_id, 
-                OneSmartFieldName.ATTRIBUTES:{mode_key:mode_value}
-            }
-            await self.wrapper.command(SOCKET_PUSH, command_mode)
-            self.wrapper.set_update_flag(self._source)
+            await self.wrapper.set_apparatus(self._device_id, {mode_key:mode_value})
 
     async def async_set_temperature(self, **kwargs):
         if ATTR_TEMPERATURE in kwargs:
             temperature = kwargs[ATTR_TEMPERATURE]
             temperature_key = self._key_target_temperature.split(".")[-1]
-            command_temperature = {
-                "command":self._source[0], OneSmartFieldName.ACTION:OneSmartAction.SET, OneSmartFieldName.ID:self._device_id, 
-                OneSmartFieldName.ATTRIBUTES:{temperature_key:temperature}
-            }
-            await self.wrapper.command(SOCKET_PUSH, **command_temperature)
-        self.wrapper.set_update_flag(self._source)
+            await self.wrapper.set_apparatus(self._device_id, {temperature_key:temperature})
 
 
     @property
@@ -0,0 +1,53 @@
+import os
+import sys
+import timeit
+
+# Compares the per-read cost of resolving dotted cache keys such as "<device_id>.<attribute>"
+# by splitting the key on every read, as entities used to, with OneSmartEntity.get_cache_value.
+# Needs Home Assistant installed, like the integration itself.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from custom_components.onesmartcontrol.onesmartentity import OneSmartEntity
+
+DEVICES = 40
+ATTRIBUTES = 40
+ITERATIONS = 200
+
+def split_per_read(cache, key):
+	value = cache
+	if len(value) == 0:
+		return None
+	for node in key.split("."):
+		if node.isdigit():
+			node = int(node)
+		if value == None:
+			return None
+		elif node in value:
+			value = value[node]
+			continue
+		else:
+			value = None
+	return value
+
+def run():
+	cache = {
+		f"device{ device }": {f"attribute_{ attribute }": attribute * 1.5 for attribute in range(ATTRIBUTES)}
+		for device in range(DEVICES)
+	}
+	keys = [f"{ device_id }.{ attribute }" for device_id in cache for attribute in cache[device_id]]
+
+	# Only the cache lookup is measured, so skip the entity's Home Assistant setup
+	entity = object.__new__(OneSmartEntity)
+	entity._cache = cache
+	entity._cache_paths = dict()
+
+	# A state write reads the key several times (native_value, available, ...)
+	before = timeit.timeit(lambda: [split_per_read(cache, key) for key in keys for _ in range(3)], number=ITERATIONS)
+	after = timeit.timeit(lambda: [entity.get_cache_value(key) for key in keys for _ in range(3)], number=ITERATIONS)
+
+	writes = ITERATIONS * len(keys)
+	print(f"{ len(keys) } entities, 3 reads per state write")
+	print(f"split per read:  { before / writes * 1e6:6.2f} us/state write")
+	print(f"get_cache_value: { after / writes * 1e6:6.2f} us/state write ({ before / after:.1f}x)")
+
+run()
@@ -0,0 +1,67 @@
+import json
+import os
+import sys
+import timeit
+
+# Usage: python benchmark_codec.py [traffic.log]
+# The optional log holds raw gateway traffic, one JSON message per line as it is sent on the socket.
+# Compares the str round-trips the socket used to do with the codec onesmartcodec selects,
+# which uses orjson or msgspec when one of them is installed.
+
+# The codec has no Home Assistant dependencies, so load it straight from the integration
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "onesmartcontrol"))
+import onesmartcodec
+
+SEPARATOR = b"\r\n"
+ITERATIONS = 2000
+
+def sample_traffic():
+	messages = []
+	for i in range(20):
+		messages.append({"event": "energy_consumption", "data": {"values": [{"id": f"meter{ meter }", "value": 100 + i * meter} for meter in range(12)]}})
+	messages.append({"event": "site_update", "data": {"mode": "HOME", "name": "Site", "nodeID": "0123456789"}})
+	messages.append({"transaction": 1, "result": {"attributes": {f"attribute_{ n }": n * 1.5 for n in range(4)}}})
+	messages.append({"transaction": 2, "result": {"devices": [
+		{"id": f"device{ n }", "name": f"Device { n }", "type": "LID_DIMMER", "group": "LIGHTS", "room": f"room{ n % 8 }", "visible": True}
+		for n in range(40)
+	]}})
+	messages.append({"transaction": 3, "result": {"attributes": [
+		{"name": f"attribute_{ n }", "access": "READ", "type": "NUMBER", "enum": ["on", "off"]}
+		for n in range(60)
+	]}})
+	return [json.dumps(message).encode() + SEPARATOR for message in messages]
+
+def recorded_traffic(path):
+	with open(path, "rb") as log:
+		return [line.rstrip(SEPARATOR) + SEPARATOR for line in log if line.strip()]
+
+def run():
+	if len(sys.argv) > 1:
+		frames = recorded_traffic(sys.argv[1])
+	else:
+		frames = sample_traffic()
+	messages = [json.loads(frame) for frame in frames]
+	print(f"{ len(frames) } messages, { sum(len(frame) for frame in frames) } bytes")
+
+	codecs = {
+		"json (str round-trip)": (
+			lambda message: (json.dumps(message) + "\r\n").encode(),
+			lambda message_bytes: json.loads(message_bytes.decode())
+		),
+		f"onesmartcodec ({ onesmartcodec.CODEC_NAME })": (
+			# Framed the way OneSmartSocket sends and reads messages
+			lambda message: onesmartcodec.encode(message) + SEPARATOR,
+			onesmartcodec.decode
+		),
+	}
+
+	baseline = None
+	for codec_name, (encode, decode) in codecs.items():
+		decode_time = timeit.timeit(lambda: [decode(frame[:-len(SEPARATOR)]) for frame in frames], number=ITERATIONS)
+		encode_time = timeit.timeit(lambda: [encode(message) for message in messages], number=ITERATIONS)
+		if baseline is None:
+			baseline = decode_time
+		per_message = decode_time / ITERATIONS / len(frames) * 1e6
+		print(f"{ codec_name:24} decode { per_message:7.2f} us/msg ({ baseline / decode_time:4.1f}x)  encode { encode_time / ITERATIONS / len(messages) * 1e6:7.2f} us/msg")
+
+run()
@@ -14,14 +14,8 @@ async def setup():
 	await gateway.authenticate("admin", "password")
 
 async def command_wait(command, **kwargs):
-	transaction_id = await gateway.send_cmd(command, **kwargs)
-	transaction_done = False
-	while not transaction_done:
-		await gateway.get_responses()
-		transaction = gateway.get_transaction(transaction_id)
-		transaction_done = transaction != None
-
-	return transaction
+	transaction = await gateway.send_cmd(command, **kwargs)
+	return await transaction
 
 
 async def shutdown():
@@ -108,7 +102,6 @@ async def run():
 
 	last_ping = time.time()
 	while True:
-		await gateway.get_responses()
 		events = gateway.get_events()
 		for event in events:
 			print(event)